@@ -1,5 +1,7 @@
 from dotenv import load_dotenv
 import os
+import hashlib
+import socket
 
 load_dotenv()
 
@@ -10,3 +12,27 @@ DATABASE_URL = os.getenv("DATABASE_URL")
 # Heroku Postgres uses postgres:// but SQLAlchemy needs postgresql://
 if DATABASE_URL and DATABASE_URL.startswith("postgres://"):
     DATABASE_URL = DATABASE_URL.replace("postgres://", "postgresql://", 1)
+
+# Identifies this process in schedule leases (set it per replica if hostnames repeat)
+INSTANCE_ID = os.getenv("INSTANCE_ID") or f"{socket.gethostname()}-{os.getpid()}"
+
+# Sharded delivery (delivery_worker.py): outbox rows are split by user_id % DELIVERY_SHARDS.
+# With more than one shard the bot process only schedules and tracks runs.
+DELIVERY_SHARDS = int(os.getenv("DELIVERY_SHARDS", "1"))
+# Optional comma-separated bot tokens for the shards (shard i uses token i % n). Only
+# useful if every recipient has started every bot; media still goes out through BOT_TOKEN.
+DELIVERY_BOT_TOKENS = [t.strip() for t in os.getenv("DELIVERY_BOT_TOKENS", "").split(",") if t.strip()] or [BOT_TOKEN]
+
+# Local copies of schedule media, used to re-upload when a stored file_id stops working
+MEDIA_CACHE_DIR = os.getenv("MEDIA_CACHE_DIR", "media_cache")
+
+# Where aiogram keeps conversation (FSM) state: "postgres" survives restarts and is
+# shared by replicas; "memory" is aiogram's MemoryStorage (lost on restart)
+FSM_STORAGE = os.getenv("FSM_STORAGE", "postgres")
+
+# Webhook mode: with WEBHOOK_URL set (public base URL, e.g. https://your-app.onrender.com)
+# Telegram pushes updates to WEBHOOK_URL + WEBHOOK_PATH; unset, the bot long-polls
+WEBHOOK_URL = os.getenv("WEBHOOK_URL", "").rstrip("/")
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/webhook")
+# Checked against X-Telegram-Bot-Api-Secret-Token; derived from the bot token when unset so replicas agree
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET") or hashlib.sha256(f"webhook:{BOT_TOKEN}".encode()).hexdigest()
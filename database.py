@@ -1,6 +1,52 @@
+import asyncio
+import logging
+
 import asyncpg
 
 from config import DATABASE_URL
 
-async def create_db_pool():
-    return await  asyncpg.create_pool(DATABASE_URL)
\ No newline at end of file
+logger = logging.getLogger(__name__)
+
+# asyncpg takes a plain libpq URL, not SQLAlchemy's "postgresql+asyncpg://" form
+ASYNCPG_DSN = DATABASE_URL.replace("postgresql+asyncpg://", "postgresql://", 1) if DATABASE_URL else None
+
+LISTENER_PING_INTERVAL = 60   # Seconds between health checks of a LISTEN connection
+LISTENER_RETRY_DELAY = 5.0    # Back-off before reconnecting a lost LISTEN connection
+
+async def create_db_pool(**kwargs):
+    return await asyncpg.create_pool(ASYNCPG_DSN, **kwargs)
+
+async def listen(channel: str, callback, on_connect=None):
+    """
+    Hold one LISTEN connection on `channel` forever, reconnecting when it drops.
+    NOTIFY is not replayed, so `on_connect` (a coroutine function) runs after
+    every (re)connect to catch up on anything missed while disconnected.
+    """
+    pool = None
+    while True:
+        try:
+            if pool is None:
+                pool = await create_db_pool(min_size=1, max_size=1)
+            async with pool.acquire() as conn:
+                lost = asyncio.Event()
+                conn.add_termination_listener(lambda _: lost.set())
+                await conn.add_listener(channel, callback)
+                if on_connect:
+                    await on_connect()
+                logger.info(f"Listening on '{channel}'")
+
+                while not lost.is_set():
+                    try:
+                        await asyncio.wait_for(lost.wait(), timeout=LISTENER_PING_INTERVAL)
+                    except asyncio.TimeoutError:
+                        # Detects half-open TCP connections that never report termination
+                        await conn.execute("SELECT 1")
+                await conn.remove_listener(channel, callback)
+            logger.warning(f"LISTEN connection on '{channel}' lost, reconnecting")
+        except asyncio.CancelledError:
+            if pool is not None:
+                await pool.close()
+            raise
+        except Exception as e:
+            logger.error(f"LISTEN on '{channel}' failed: {e}")
+        await asyncio.sleep(LISTENER_RETRY_DELAY)
@@ -1,8 +1,9 @@
 # db/models.py — ULTIMATE VERSION
 from sqlalchemy import (
-    Column, Integer, String, Boolean, DateTime, ForeignKey, Enum, Table, Text
+    Column, Integer, String, Boolean, DateTime, ForeignKey, Enum, Table, Text,
+    Index, UniqueConstraint, text
 )
-from sqlalchemy.dialects.postgresql import BIGINT
+from sqlalchemy.dialects.postgresql import BIGINT, JSONB
 from sqlalchemy.orm import relationship, declarative_base
 from datetime import datetime
 import enum
@@ -14,15 +15,30 @@ class ScheduleType(enum.Enum):
     MONTHLY = "monthly"
     CUSTOM = "custom"
 
+class OutboxStatus(enum.Enum):
+    PENDING = "pending"    # Waiting to be claimed by a worker
+    SENDING = "sending"    # Claimed; next_attempt_at holds the lease expiry
+    SENT = "sent"
+    BLOCKED = "blocked"    # Bot blocked, chat not found or account deactivated
+    FAILED = "failed"
+
 schedule_batch_association = Table(
     "schedule_batch_association",
     Base.metadata,
     Column("schedule_id", ForeignKey("schedules.id"), primary_key=True),
-    Column("batch_id", ForeignKey("batches.id"), primary_key=True)
+    Column("batch_id", ForeignKey("batches.id"), primary_key=True),
+    Index("ix_schedule_batch_association_batch_id", "batch_id", postgresql_include=["schedule_id"])
 )
 
 class User(Base):
     __tablename__ = "users"
+    __table_args__ = (
+        # Covers the audience keyset query so broadcast pages are index-only scans
+        Index(
+            "ix_users_batch_audience", "batch_id", "id",
+            postgresql_include=["user_id", "full_name", "gender", "join_date", "is_reachable", "unreachable_since"]
+        ),
+    )
     id = Column(Integer, primary_key=True)  # Internal DB ID
     user_id = Column(BIGINT, unique=True, nullable=False)  # Telegram ID
     username = Column(String, nullable=True)
@@ -31,6 +47,8 @@ class User(Base):
     is_admin = Column(Boolean, default=False)
     batch_id = Column(Integer, ForeignKey("batches.id"), nullable=True)
     join_date = Column(DateTime, default=datetime.utcnow)
+    is_reachable = Column(Boolean, nullable=False, default=True, server_default="true")
+    unreachable_since = Column(DateTime, nullable=True)  # Last time a send found the chat blocked/gone
     batch = relationship("Batch", back_populates="users")
 
 class Batch(Base):
@@ -46,6 +64,9 @@ class Batch(Base):
 
 class Schedule(Base):
     __tablename__ = "schedules"
+    __table_args__ = (
+        Index("ix_schedules_active_next_run", "next_run", postgresql_include=["id"], postgresql_where=text("is_active")),
+    )
     id = Column(Integer, primary_key=True)
     message = Column(Text, nullable=True)  # Now optional (can be media-only)
     media_type = Column(String, nullable=True)  # 'photo', 'video', 'document', or None
@@ -57,8 +78,40 @@ class Schedule(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
     admin_id = Column(BIGINT, nullable=False)      # ← Telegram ID
     is_active = Column(Boolean, default=True)
+    lease_owner = Column(String, nullable=True)        # Instance executing the current run
+    lease_expires_at = Column(DateTime, nullable=True) # Run may be taken over after this
     batches = relationship(
         "Batch",
         secondary=schedule_batch_association,
         back_populates="schedules"
-    )
\ No newline at end of file
+    )
+
+class BroadcastOutbox(Base):
+    """Delivery of one schedule run to a single user; doubles as the delivery ledger."""
+    __tablename__ = "broadcast_outbox"
+    __table_args__ = (
+        UniqueConstraint("schedule_id", "run_at", "user_id", name="uq_broadcast_outbox_run_user"),
+        Index("ix_broadcast_outbox_claim", "status", "next_attempt_at"),
+    )
+    id = Column(BIGINT, primary_key=True)
+    schedule_id = Column(Integer, ForeignKey("schedules.id", ondelete="CASCADE"), nullable=False)
+    run_at = Column(DateTime, nullable=False)          # The next_run this delivery belongs to
+    user_id = Column(BIGINT, nullable=False)           # ← Telegram ID
+    full_name = Column(String, nullable=True)
+    gender = Column(String, nullable=True)             # Template variables, snapshotted at enqueue
+    batch_name = Column(String, nullable=True)
+    join_date = Column(DateTime, nullable=True)
+    status = Column(Enum(OutboxStatus, native_enum=False, length=16), nullable=False, default=OutboxStatus.PENDING)
+    attempts = Column(Integer, nullable=False, default=0)
+    next_attempt_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    delivered_at = Column(DateTime, nullable=True)     # When the final outcome was recorded
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+
+class FsmRecord(Base):
+    """Conversation state of one chat/user (aiogram FSM), see services/fsm_storage.py."""
+    __tablename__ = "fsm_states"
+    key = Column(String, primary_key=True)             # bot:chat:user:thread:business:destiny
+    state = Column(String, nullable=True)
+    data = Column(JSONB, nullable=False, server_default=text("'{}'::jsonb"))
+    updated_at = Column(DateTime, nullable=False, default=datetime.utcnow)
@@ -0,0 +1,85 @@
+# delivery_worker.py
+"""
+Sharded broadcast delivery.
+
+Each shard is a separate process with its own event loop, Bot session and
+rate limiter, delivering the outbox rows with user_id % DELIVERY_SHARDS equal
+to its index. The bot process (main.py) keeps scheduling runs, writes the
+outbox and tracks completion.
+
+A token's rate limit is split between everything sending on it (see
+services.scheduler.token_shares). Shards on a DELIVERY_BOT_TOKENS token send
+media through the main bot, because preflight_media validated the file_id
+for that bot only and file_ids do not carry over between bots.
+
+    python delivery_worker.py             # spawn all DELIVERY_SHARDS shards
+    python delivery_worker.py --shard 2   # run one shard (e.g. one dyno per shard)
+"""
+import argparse
+import asyncio
+import logging
+import multiprocessing
+
+from aiogram import Bot
+from aiogram.enums import ParseMode
+from aiogram.client.default import DefaultBotProperties
+
+from config import BOT_TOKEN, DELIVERY_SHARDS
+from database import listen
+from services.rate_limiter import AdaptiveRateLimiter, global_limiter
+from services.scheduler import BroadcastManager, OUTBOX_CHANNEL, shard_token, token_shares
+
+logger = logging.getLogger("scheduler")
+
+
+async def run_shard(shard: int):
+    token = shard_token(shard)
+    # Telegram's limit is per token: everything sending on it splits its budget
+    global_limiter.scale(1 / token_shares(token))
+
+    bot = Bot(token=token, default=DefaultBotProperties(parse_mode=ParseMode.HTML))
+    media_bot, media_limiter = None, None
+    if token != BOT_TOKEN:
+        media_bot = Bot(token=BOT_TOKEN, default=DefaultBotProperties(parse_mode=ParseMode.HTML))
+        media_limiter = AdaptiveRateLimiter()
+        media_limiter.scale(1 / token_shares(BOT_TOKEN))
+    manager = BroadcastManager(
+        bot, shard=shard, shards=DELIVERY_SHARDS, media_bot=media_bot, media_limiter=media_limiter
+    )
+    manager.start()
+    logger.info(f"Delivery shard {shard}/{DELIVERY_SHARDS} up at {global_limiter.rate:.1f} msg/s")
+    try:
+        # Runs forever; the bot process NOTIFYs after each committed outbox chunk
+        await listen(OUTBOX_CHANNEL, lambda *_: manager.notify())
+    finally:
+        await manager.stop()
+        await bot.session.close()
+        if media_bot:
+            await media_bot.session.close()
+
+
+def _shard_process(shard: int):
+    asyncio.run(run_shard(shard))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--shard", type=int, help=f"shard index in [0, {DELIVERY_SHARDS})")
+    args = parser.parse_args()
+
+    if args.shard is not None:
+        if not 0 <= args.shard < DELIVERY_SHARDS:
+            parser.error(f"--shard must be in [0, {DELIVERY_SHARDS})")
+        _shard_process(args.shard)
+        return
+
+    ctx = multiprocessing.get_context("spawn")
+    processes = [ctx.Process(target=_shard_process, args=(i,), name=f"shard-{i}") for i in range(DELIVERY_SHARDS)]
+    for p in processes:
+        p.start()
+    for p in processes:
+        p.join()
+
+
+if __name__ == "__main__":
+    main()
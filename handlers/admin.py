@@ -10,6 +10,7 @@ from db.models import User
 from config import SUPER_ADMIN_ID
 from keyboard.user_count import total_users_keyboard
 from services.admin_services import get_user_by_username, promote_user_to_admin, demote_admin
+from services.rate_limiter import acquire_send_slot
 from keyboard.add_admin import add_admin_keyboard
 from keyboard.remove_admin import remove_admin_keyboard
 from aiogram.filters import Command, StateFilter
@@ -122,6 +123,7 @@ async def confirm_add_admin(callback: types.CallbackQuery):
         
         # Notify the promoted user
         try:
+            await acquire_send_slot(user.user_id)
             await bot.send_message(
                 chat_id=user.user_id,
                 text=(
@@ -328,6 +330,7 @@ async def confirm_remove_admin(callback: types.CallbackQuery):
         
         # Notify the demoted user
         try:
+            await acquire_send_slot(user.user_id)
             await bot.send_message(
                 chat_id=user.user_id,
                 text=(
@@ -6,13 +6,14 @@ from aiogram.fsm.context import FSMContext
 from datetime import datetime, timedelta
 import re
 from loader import dp
-from db.session import AsyncSessionLocal
-from db.models import Batch, ScheduleType
-from sqlalchemy import select
+from db.models import ScheduleType
 from keyboard.inline import get_batch_keyboard, get_schedule_type_keyboard
 from .states import ScheduleStates
 from .helpers import ensure_user_exists, format_12hour, save_schedule
+from services.batches import batch_registry
 from .ui import create_calendar
+from utils.message_utils import compile_template, MessageFormatError, TEMPLATE_HINT
+import html
 import logging
 
 logger = logging.getLogger(__name__)
@@ -28,8 +29,7 @@ async def cmd_schedule(message: types.Message, state: FSMContext):
         await message.answer("You don't have permission to use this command.")
         return
 
-    async with AsyncSessionLocal() as session:
-        batches = (await session.execute(select(Batch))).scalars().all()
+    batches = batch_registry.all()
 
     if not batches:
         await message.answer("No batches found in the database.")
@@ -58,8 +58,7 @@ async def process_batch(callback: types.CallbackQuery, state: FSMContext):
         selected.append(batch_id)
     await state.update_data(batches=selected)
 
-    async with AsyncSessionLocal() as session:
-        batches = (await session.execute(select(Batch))).scalars().all()
+    batches = batch_registry.all()
 
     await callback.message.edit_reply_markup(reply_markup=get_batch_keyboard(batches, selected))
 
@@ -228,7 +227,7 @@ async def process_time_input(message: types.Message, state: FSMContext):
     ethiopia_display = format_12hour(next_run_utc)
     await message.answer(
         f"✅ Scheduled for: <b>{ethiopia_display}</b>\n\n"
-        "Now enter the message you want to send:",
+        "Now enter the message you want to send:\n" + TEMPLATE_HINT,
         parse_mode="HTML"
     )
     await state.set_state(ScheduleStates.entering_message)
@@ -266,7 +265,7 @@ async def process_time_selection(callback: types.CallbackQuery, state: FSMContex
     nice_time = format_12hour(next_run)
     await callback.message.edit_text(
         f"Scheduled for: <b>{nice_time}</b>\n\n"
-        "Now enter the message you want to send:",
+        "Now enter the message you want to send:\n" + TEMPLATE_HINT,
         parse_mode="HTML"
     )
     await state.set_state(ScheduleStates.entering_message)
@@ -305,6 +304,17 @@ async def process_message(message: types.Message, state: FSMContext):
     else:
         await message.answer("❌ Unsupported message type. Please send text, photo, video, or document.")
         return
+
+    # Parse the HTML now: a mistake here would otherwise fail on every recipient
+    try:
+        compile_template(text_message or caption or "")
+    except MessageFormatError as e:
+        await message.answer(
+            f"❌ <b>Formatting error:</b> {html.escape(str(e))}\n\n"
+            f"Fix the message and send it again.",
+            parse_mode="HTML"
+        )
+        return
     
     # Store in state
     await state.update_data(
@@ -316,11 +326,7 @@ async def process_message(message: types.Message, state: FSMContext):
     
     data = await state.get_data()
 
-    async with AsyncSessionLocal() as session:
-        batch_names = [
-            (await session.execute(select(Batch.name).where(Batch.id == bid))).scalar_one()
-            for bid in data["batches"]
-        ]
+    batch_names = [batch_registry.name(bid) for bid in data["batches"]]
 
     nice_time = format_12hour(data["next_run"])
     
@@ -5,7 +5,7 @@ from aiogram.fsm.context import FSMContext
 from datetime import datetime
 from loader import dp
 from db.session import AsyncSessionLocal
-from db.models import Schedule, Batch, ScheduleType, schedule_batch_association
+from db.models import Schedule, ScheduleType, schedule_batch_association
 from sqlalchemy import select, update, delete
 from sqlalchemy.orm import selectinload
 from keyboard.inline import (
@@ -17,7 +17,11 @@ from keyboard.inline import (
 )
 from .states import EditScheduleStates
 from .helpers import ensure_user_exists, format_12hour
+from services.scheduler import notify_schedule_changed
+from services.batches import batch_registry
+from utils.message_utils import compile_template, MessageFormatError, TEMPLATE_HINT
 from .ui import create_calendar, create_time_picker
+import html
 import logging
 
 logger = logging.getLogger(__name__)
@@ -74,7 +78,7 @@ async def handle_edit_message_start(callback: types.CallbackQuery, state: FSMCon
     await callback.message.edit_text(
         f"📝 <b>Edit Message for Schedule #{schedule_id}</b>\n\n"
         f"<b>Current message:</b>\n<blockquote>{sched.message[:500]}</blockquote>\n\n"
-        f"Send the new message:",
+        f"Send the new message:\n{TEMPLATE_HINT}",
         reply_markup=get_cancel_keyboard(schedule_id),
         parse_mode="HTML"
     )
@@ -96,6 +100,17 @@ async def process_edit_message(message: types.Message, state: FSMContext):
         await state.clear()
         return
 
+    try:
+        compile_template(message.text or "")
+    except MessageFormatError as e:
+        # Stay in the editing state so the admin can resend the fixed text
+        await message.answer(
+            f"❌ <b>Formatting error:</b> {html.escape(str(e))}\n\n"
+            f"Fix the message and send it again.",
+            parse_mode="HTML"
+        )
+        return
+
     async with AsyncSessionLocal() as session:
         await session.execute(
             update(Schedule).where(Schedule.id == schedule_id).values(message=message.text)
@@ -226,6 +241,7 @@ async def handle_edit_time_hour(callback: types.CallbackQuery, state: FSMContext
         )
         sched = result.scalar_one()
 
+    notify_schedule_changed(sched.id, sched.next_run, sched.is_active)
     await state.clear()
     
     logger.info(f"Schedule #{schedule_id} time updated to {next_run} by admin {callback.from_user.id}")
@@ -263,9 +279,9 @@ async def handle_edit_batches_start(callback: types.CallbackQuery, state: FSMCon
             await callback.answer("Schedule not found!", show_alert=True)
             return
         
-        all_batches = (await session.execute(select(Batch))).scalars().all()
         current_batch_ids = [b.id for b in sched.batches]
 
+    all_batches = batch_registry.all()
     await state.update_data(
         editing_schedule_id=schedule_id, 
         editing_batch_ids=current_batch_ids.copy()
@@ -298,8 +314,7 @@ async def handle_edit_batch_toggle(callback: types.CallbackQuery, state: FSMCont
     
     await state.update_data(editing_batch_ids=selected)
 
-    async with AsyncSessionLocal() as session:
-        all_batches = (await session.execute(select(Batch))).scalars().all()
+    all_batches = batch_registry.all()
 
     await callback.message.edit_reply_markup(
         reply_markup=get_edit_batch_keyboard(all_batches, selected, schedule_id)
@@ -481,6 +496,7 @@ async def process_edit_cron(message: types.Message, state: FSMContext):
         )
         sched = result.scalar_one()
 
+    notify_schedule_changed(sched.id, sched.next_run, sched.is_active)
     await state.clear()
     
     logger.info(f"Schedule #{schedule_id} type updated to CUSTOM ({message.text}) by {message.from_user.id}")
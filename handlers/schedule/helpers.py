@@ -2,9 +2,12 @@
 """Helper functions for schedule management."""
 from datetime import datetime, timedelta
 from db.session import AsyncSessionLocal
-from db.models import User, Schedule
-from sqlalchemy import select
+from db.models import User, Schedule, BroadcastOutbox, OutboxStatus
+from sqlalchemy import select, func
+from sqlalchemy.orm import load_only, selectinload
 from config import SUPER_ADMIN_ID
+from services.scheduler import notify_schedule_changed
+from services.admin_services import admin_flags
 import logging
 
 logger = logging.getLogger(__name__)
@@ -24,6 +27,11 @@ def format_12hour(dt: datetime) -> str:
 
 async def ensure_user_exists(user_id: int, username: str | None = None) -> bool:
     """Check if user exists and is admin, create if doesn't exist."""
+    # Answered from memory for every click after the first; promote/demote invalidate it
+    is_admin = admin_flags.get(user_id)
+    if is_admin is not None:
+        return is_admin or (user_id == SUPER_ADMIN_ID)
+
     async with AsyncSessionLocal() as session:
         try:
             result = await session.execute(select(User).where(User.user_id == user_id))
@@ -40,9 +48,11 @@ async def ensure_user_exists(user_id: int, username: str | None = None) -> bool:
                 )
                 session.add(new_user)
                 await session.commit()
+                admin_flags.set(user_id, is_super)
                 logger.info(f"NEW USER CREATED: {user_id} | SuperAdmin: {is_super}")
                 return True  # Admins always allowed
 
+            admin_flags.set(user_id, bool(user.is_admin))
             return user.is_admin or (user_id == SUPER_ADMIN_ID)
         except Exception as e:
             logger.error(f"USER CHECK FAILED: {e}")
@@ -84,9 +94,96 @@ async def save_schedule(data: dict, admin_id: int) -> Schedule | None:
                 )
 
             await session.commit()
+            notify_schedule_changed(sched.id, sched.next_run)
             logger.info(f"Schedule #{sched.id} saved successfully (media: {media_type})")
             return sched
         except Exception as e:
             await session.rollback()
             logger.error(f"Schedule save failed: {e}")
             return None
+
+
+async def get_delivery_report(schedule_id: int, limit: int = 5) -> list:
+    """Per-run delivery counts for a schedule, newest run first."""
+    status = BroadcastOutbox.status
+    stmt = (
+        select(
+            BroadcastOutbox.run_at,
+            func.count().label("total"),
+            func.count().filter(status == OutboxStatus.SENT).label("sent"),
+            func.count().filter(status == OutboxStatus.BLOCKED).label("blocked"),
+            func.count().filter(status == OutboxStatus.FAILED).label("failed"),
+            func.count().filter(status.in_([OutboxStatus.PENDING, OutboxStatus.SENDING])).label("pending"),
+            func.min(BroadcastOutbox.created_at).label("started_at"),
+            func.max(BroadcastOutbox.delivered_at).label("last_delivery_at"),
+        )
+        .where(BroadcastOutbox.schedule_id == schedule_id)
+        .group_by(BroadcastOutbox.run_at)
+        .order_by(BroadcastOutbox.run_at.desc())
+        .limit(limit)
+    )
+    async with AsyncSessionLocal() as session:
+        return (await session.execute(stmt)).all()
+
+
+SCHEDULES_PER_PAGE = 5
+LIST_CHUNK_SIZE = 100          # Schedules read per query when streaming the full list
+LIST_MESSAGE_LIMIT = 4000      # Below Telegram's 4096 (HTML is never shorter than the text it renders)
+LIST_EXPORT_THRESHOLD = 150    # Above this many schedules /list_schedules sends a CSV file instead
+
+# The list keyboard only shows status and a short preview
+_LIST_COLUMNS = load_only(Schedule.id, Schedule.is_active, Schedule.media_type, Schedule.caption, Schedule.message)
+
+
+async def get_schedule_counts() -> tuple[int, int]:
+    """(total, active) schedule counts from a single aggregate row."""
+    stmt = select(func.count(), func.count().filter(Schedule.is_active)).select_from(Schedule)
+    async with AsyncSessionLocal() as session:
+        total, active = (await session.execute(stmt)).one()
+    return total, active
+
+
+async def get_schedule_page(
+    older_than: int | None = None,
+    newer_than: int | None = None,
+    limit: int = SCHEDULES_PER_PAGE
+) -> list[Schedule]:
+    """
+    One page of the management list, newest first, by keyset on id: the page
+    after a cursor is `id < older_than`, the page before it `id > newer_than`.
+    Only `limit` rows are read however many schedules exist.
+    """
+    stmt = select(Schedule).options(_LIST_COLUMNS).limit(limit)
+    if newer_than is not None:
+        stmt = stmt.where(Schedule.id > newer_than).order_by(Schedule.id.asc())
+    else:
+        if older_than is not None:
+            stmt = stmt.where(Schedule.id < older_than)
+        stmt = stmt.order_by(Schedule.id.desc())
+    async with AsyncSessionLocal() as session:
+        schedules = (await session.execute(stmt)).scalars().all()
+    return sorted(schedules, key=lambda s: s.id, reverse=True)
+
+
+async def iter_schedules(chunk_size: int = LIST_CHUNK_SIZE):
+    """
+    Every schedule with its batches, newest first. Read in keyset chunks, each
+    in its own short session, so only one chunk is held in memory at a time.
+    """
+    cursor = None
+    while True:
+        stmt = (
+            select(Schedule)
+            .options(selectinload(Schedule.batches))
+            .order_by(Schedule.id.desc())
+            .limit(chunk_size)
+        )
+        if cursor is not None:
+            stmt = stmt.where(Schedule.id < cursor)
+        async with AsyncSessionLocal() as session:
+            chunk = (await session.execute(stmt)).scalars().all()
+        for sched in chunk:
+            yield sched
+        if len(chunk) < chunk_size:
+            return
+        cursor = chunk[-1].id
@@ -1,40 +1,79 @@
 # handlers/schedule/manage.py
-"""Schedule management (list, view, toggle, delete)."""
+"""Schedule management (list, view, toggle, delete, delivery reports)."""
 from aiogram import types, F
 from aiogram.filters import Command
 from aiogram.fsm.context import FSMContext
+from aiogram.exceptions import TelegramBadRequest
 from loader import dp
 from db.session import AsyncSessionLocal
-from db.models import Schedule, Batch, schedule_batch_association
+from db.models import Schedule, schedule_batch_association
 from sqlalchemy import select, update, delete
 from sqlalchemy.orm import selectinload
 from keyboard.inline import (
     get_schedule_list_keyboard,
     get_schedule_actions_keyboard,
     get_confirm_delete_keyboard,
+    get_delivery_report_keyboard,
 )
-from .helpers import ensure_user_exists, format_12hour
+from .helpers import (
+    ensure_user_exists,
+    format_12hour,
+    get_delivery_report,
+    get_schedule_counts,
+    get_schedule_page,
+    iter_schedules,
+    SCHEDULES_PER_PAGE,
+    LIST_EXPORT_THRESHOLD,
+    LIST_MESSAGE_LIMIT,
+)
+from services.scheduler import notify_schedule_changed
+from services.batches import batch_registry
+from services.rate_limiter import acquire_send_slot
+from datetime import datetime
+import csv
+import html
 import logging
+import os
+import tempfile
 
 logger = logging.getLogger(__name__)
 
 
+def _total_pages(total: int) -> int:
+    return max(1, (total + SCHEDULES_PER_PAGE - 1) // SCHEDULES_PER_PAGE)
+
+
+async def _management_panel() -> tuple[str, types.InlineKeyboardMarkup] | None:
+    """Text and first page of the management panel, or None when there are no schedules."""
+    total, active_count = await get_schedule_counts()
+    if not total:
+        return None
+    schedules = await get_schedule_page()
+
+    text = (
+        f"📋 <b>Schedule Management</b>\n"
+        f"━━━━━━━━━━━━━━━━━━━━━━\n\n"
+        f"📊 <b>Statistics:</b>\n"
+        f"• Total: <code>{total}</code>\n"
+        f"• Active: <code>{active_count}</code> ✅\n"
+        f"• Paused: <code>{total - active_count}</code> ⏸️\n\n"
+        f"👇 Select a schedule to manage:"
+    )
+    return text, get_schedule_list_keyboard(schedules, page=0, total_pages=_total_pages(total))
+
+
 # ----------------------------------------------------------------------
 # /list_schedules COMMAND
 # ----------------------------------------------------------------------
 @dp.message(Command("list_schedules"))
 async def cmd_list_schedules(message: types.Message):
-    """List all schedules with details."""
+    """List all schedules with details, split over as many messages as needed."""
     if not await ensure_user_exists(message.from_user.id):
         await message.answer("No permission.")
         return
 
-    async with AsyncSessionLocal() as session:
-        schedules = (await session.execute(
-            select(Schedule).options(selectinload(Schedule.batches)).order_by(Schedule.id.desc())
-        )).scalars().all()
-
-    if not schedules:
+    total, active_count = await get_schedule_counts()
+    if not total:
         await message.answer(
             "📭 <b>No Schedules Found</b>\n\n"
             "Use /schedule to create your first broadcast.",
@@ -43,45 +82,91 @@ async def cmd_list_schedules(message: types.Message):
         return
 
     # Header with stats
-    active_count = sum(1 for s in schedules if s.is_active)
-    paused_count = len(schedules) - active_count
-    
     header = (
-        f"📋 <b>All Schedules ({len(schedules)})</b>\n"
+        f"📋 <b>All Schedules ({total})</b>\n"
         f"━━━━━━━━━━━━━━━━━━━━━━\n"
         f"✅ Active: <code>{active_count}</code> | "
-        f"⏸️ Paused: <code>{paused_count}</code>\n\n"
+        f"⏸️ Paused: <code>{total - active_count}</code>"
     )
 
-    lines = []
-    for s in schedules:
-        status = "✅" if s.is_active else "⏸️"
-        batches = ", ".join(b.name for b in s.batches) if s.batches else "None"
-        
-        # Handle both text and media schedules
-        if s.media_type:
-            media_icon = {"photo": "📷", "video": "🎥", "document": "📄"}.get(s.media_type, "📎")
-            content = f"{media_icon} {s.caption[:40] if s.caption else '(no caption)'}"
-        else:
-            content = (s.message or "(empty)")[:40]
-        
-        msg_preview = content.replace("\n", " ")
-        if len(content) > 40:
-            msg_preview += "..."
-        
-        lines.append(
-            f"<b>#{s.id}</b> {status} | {s.type.value.title()}\n"
-            f"  ⏰ {format_12hour(s.next_run)}\n"
-            f"  📦 {batches}\n"
-            f"  💬 <i>{msg_preview}</i>"
+    if total > LIST_EXPORT_THRESHOLD:
+        await message.answer(
+            header + "\n\nToo many to list here; sending them as a file.",
+            parse_mode="HTML"
         )
+        await _send_schedule_export(message)
+        return
 
-    await message.answer(
-        header + "\n━━━━━━━━━━━━━━━━━━━━━━\n\n".join(lines),
-        parse_mode="HTML"
+    await message.answer(header, parse_mode="HTML")
+    separator = "\n━━━━━━━━━━━━━━━━━━━━━━\n\n"
+    async for chunk in _chunk_text((_schedule_entry(s) async for s in iter_schedules()), separator):
+        # Several messages to one chat in a row: keep to Telegram's per-chat pace
+        await acquire_send_slot(message.chat.id)
+        await message.answer(chunk, parse_mode="HTML")
+
+
+def _schedule_entry(s: Schedule) -> str:
+    """One schedule's block in /list_schedules."""
+    status = "✅" if s.is_active else "⏸️"
+    batches = ", ".join(b.name for b in s.batches) if s.batches else "None"
+
+    # Handle both text and media schedules
+    if s.media_type:
+        media_icon = {"photo": "📷", "video": "🎥", "document": "📄"}.get(s.media_type, "📎")
+        content = f"{media_icon} {s.caption[:40] if s.caption else '(no caption)'}"
+    else:
+        content = (s.message or "(empty)")[:40]
+
+    # Escaped: a cut-off tag in the preview would make Telegram reject the whole message
+    msg_preview = html.escape(content.replace("\n", " "))
+    if len(content) > 40:
+        msg_preview += "..."
+
+    return (
+        f"<b>#{s.id}</b> {status} | {s.type.value.title()}\n"
+        f"  ⏰ {format_12hour(s.next_run)}\n"
+        f"  📦 {batches}\n"
+        f"  💬 <i>{msg_preview}</i>"
     )
 
 
+async def _chunk_text(entries, separator: str, limit: int = LIST_MESSAGE_LIMIT):
+    """Join entries with separator into messages of at most `limit` characters, as they arrive."""
+    buffer, size = [], 0
+    async for entry in entries:
+        added = len(entry) + (len(separator) if buffer else 0)
+        if buffer and size + added > limit:
+            yield separator.join(buffer)
+            buffer, size, added = [], 0, len(entry)
+        buffer.append(entry)
+        size += added
+    if buffer:
+        yield separator.join(buffer)
+
+
+async def _send_schedule_export(message: types.Message):
+    """Stream every schedule into a CSV on disk and send it as a document."""
+    fd, path = tempfile.mkstemp(prefix="schedules_", suffix=".csv")
+    try:
+        with os.fdopen(fd, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(["id", "status", "type", "next_run", "batches", "media_type", "content"])
+            async for s in iter_schedules():
+                writer.writerow([
+                    s.id,
+                    "active" if s.is_active else "paused",
+                    s.type.value,
+                    format_12hour(s.next_run) if s.next_run else "",
+                    ", ".join(b.name for b in s.batches),
+                    s.media_type or "",
+                    (s.caption if s.media_type else s.message) or "",
+                ])
+        filename = f"schedules_{datetime.utcnow():%Y-%m-%d}.csv"
+        await message.answer_document(types.FSInputFile(path, filename=filename))
+    finally:
+        os.remove(path)
+
+
 # ----------------------------------------------------------------------
 # /manage_schedules COMMAND
 # ----------------------------------------------------------------------
@@ -94,13 +179,8 @@ async def cmd_manage_schedules(message: types.Message, state: FSMContext):
 
     await state.clear()
     
-    async with AsyncSessionLocal() as session:
-        result = await session.execute(
-            select(Schedule).options(selectinload(Schedule.batches)).order_by(Schedule.id.desc())
-        )
-        schedules = result.scalars().all()
-
-    if not schedules:
+    panel = await _management_panel()
+    if not panel:
         await message.answer(
             "📭 <b>No Schedules Found</b>\n\n"
             "Use /schedule to create your first scheduled broadcast.",
@@ -108,20 +188,8 @@ async def cmd_manage_schedules(message: types.Message, state: FSMContext):
         )
         return
 
-    active_count = sum(1 for s in schedules if s.is_active)
-    paused_count = len(schedules) - active_count
-
-    await message.answer(
-        f"📋 <b>Schedule Management</b>\n"
-        f"━━━━━━━━━━━━━━━━━━━━━━\n\n"
-        f"📊 <b>Statistics:</b>\n"
-        f"• Total: <code>{len(schedules)}</code>\n"
-        f"• Active: <code>{active_count}</code> ✅\n"
-        f"• Paused: <code>{paused_count}</code> ⏸️\n\n"
-        f"👇 Select a schedule to manage:",
-        reply_markup=get_schedule_list_keyboard(schedules, page=0),
-        parse_mode="HTML"
-    )
+    text, keyboard = panel
+    await message.answer(text, reply_markup=keyboard, parse_mode="HTML")
 
 
 # ----------------------------------------------------------------------
@@ -134,16 +202,25 @@ async def handle_schedule_pagination(callback: types.CallbackQuery, state: FSMCo
         await callback.answer("No permission.", show_alert=True)
         return
 
-    page = int(callback.data.split("_")[2])
-    
-    async with AsyncSessionLocal() as session:
-        result = await session.execute(
-            select(Schedule).options(selectinload(Schedule.batches)).order_by(Schedule.id.desc())
-        )
-        schedules = result.scalars().all()
+    # sched_page_{page}_lt_{id} (next page) or sched_page_{page}_gt_{id} (previous page)
+    parts = callback.data.split("_")
+    page, schedules = 0, []
+    if len(parts) == 5:
+        page, direction, cursor = int(parts[2]), parts[3], int(parts[4])
+        if direction == "lt":
+            schedules = await get_schedule_page(older_than=cursor)
+        else:
+            schedules = await get_schedule_page(newer_than=cursor)
+            if len(schedules) < SCHEDULES_PER_PAGE:
+                schedules = []  # short page going back: we reached the newest
+    if not schedules:
+        # Top of the list, or a stale button (schedules deleted since it was drawn)
+        page, schedules = 0, await get_schedule_page()
 
+    total, _ = await get_schedule_counts()
+    total_pages = _total_pages(total)
     await callback.message.edit_reply_markup(
-        reply_markup=get_schedule_list_keyboard(schedules, page=page)
+        reply_markup=get_schedule_list_keyboard(schedules, page=min(page, total_pages - 1), total_pages=total_pages)
     )
     await callback.answer()
 
@@ -222,13 +299,8 @@ async def handle_back_to_list(callback: types.CallbackQuery, state: FSMContext):
 
     await state.clear()
     
-    async with AsyncSessionLocal() as session:
-        result = await session.execute(
-            select(Schedule).options(selectinload(Schedule.batches)).order_by(Schedule.id.desc())
-        )
-        schedules = result.scalars().all()
-
-    if not schedules:
+    panel = await _management_panel()
+    if not panel:
         await callback.message.edit_text(
             "📭 <b>No Schedules Found</b>\n\n"
             "Use /schedule to create a new broadcast.",
@@ -236,20 +308,8 @@ async def handle_back_to_list(callback: types.CallbackQuery, state: FSMContext):
         )
         return
 
-    active_count = sum(1 for s in schedules if s.is_active)
-    paused_count = len(schedules) - active_count
-
-    await callback.message.edit_text(
-        f"📋 <b>Schedule Management</b>\n"
-        f"━━━━━━━━━━━━━━━━━━━━━━\n\n"
-        f"📊 <b>Statistics:</b>\n"
-        f"• Total: <code>{len(schedules)}</code>\n"
-        f"• Active: <code>{active_count}</code> ✅\n"
-        f"• Paused: <code>{paused_count}</code> ⏸️\n\n"
-        f"👇 Select a schedule to manage:",
-        reply_markup=get_schedule_list_keyboard(schedules, page=0),
-        parse_mode="HTML"
-    )
+    text, keyboard = panel
+    await callback.message.edit_text(text, reply_markup=keyboard, parse_mode="HTML")
     await callback.answer()
 
 
@@ -263,8 +323,7 @@ async def handle_create_new_schedule(callback: types.CallbackQuery, state: FSMCo
         await callback.answer("No permission.", show_alert=True)
         return
 
-    async with AsyncSessionLocal() as session:
-        batches = (await session.execute(select(Batch))).scalars().all()
+    batches = batch_registry.all()
 
     if not batches:
         await callback.answer("No batches found!", show_alert=True)
@@ -316,6 +375,7 @@ async def handle_toggle_schedule(callback: types.CallbackQuery, state: FSMContex
         )
         sched = result.scalar_one()
 
+    notify_schedule_changed(sched.id, sched.next_run, sched.is_active)
     action = "resumed ▶️" if new_status else "paused ⏸️"
     await callback.answer(f"Schedule #{schedule_id} {action}", show_alert=True)
     
@@ -359,6 +419,59 @@ async def handle_toggle_schedule(callback: types.CallbackQuery, state: FSMContex
     )
 
 
+# ----------------------------------------------------------------------
+# DELIVERY REPORT
+# ----------------------------------------------------------------------
+@dp.callback_query(F.data.startswith("sched_report_"))
+async def handle_delivery_report(callback: types.CallbackQuery, state: FSMContext):
+    """Show sent/blocked/failed/pending counts and throughput for recent runs."""
+    if not await ensure_user_exists(callback.from_user.id):
+        await callback.answer("No permission.", show_alert=True)
+        return
+
+    schedule_id = int(callback.data.split("_")[2])
+    runs = await get_delivery_report(schedule_id)
+
+    if not runs:
+        text = (
+            f"📊 <b>Delivery Report — Schedule #{schedule_id}</b>\n\n"
+            f"This schedule has not run yet."
+        )
+    else:
+        blocks = []
+        for run in runs:
+            done = run.sent + run.blocked + run.failed
+            throughput = ""
+            if run.last_delivery_at and run.started_at and done:
+                elapsed = (run.last_delivery_at - run.started_at).total_seconds()
+                if elapsed > 0:
+                    throughput = f"\n  ⚡ {done / elapsed:.1f} msg/s over {int(elapsed)}s"
+            blocks.append(
+                f"<b>Run:</b> <code>{format_12hour(run.run_at)}</code>\n"
+                f"  👥 Audience: <code>{run.total}</code>\n"
+                f"  ✅ Sent: <code>{run.sent}</code> | "
+                f"🚫 Blocked: <code>{run.blocked}</code>\n"
+                f"  ❌ Failed: <code>{run.failed}</code> | "
+                f"⏳ Pending: <code>{run.pending}</code>"
+                f"{throughput}"
+            )
+        text = (
+            f"📊 <b>Delivery Report — Schedule #{schedule_id}</b>\n"
+            f"━━━━━━━━━━━━━━━━━━━━━━\n\n"
+            + "\n\n".join(blocks)
+        )
+
+    try:
+        await callback.message.edit_text(
+            text,
+            reply_markup=get_delivery_report_keyboard(schedule_id),
+            parse_mode="HTML"
+        )
+    except TelegramBadRequest:
+        pass  # Refresh with unchanged counts ("message is not modified")
+    await callback.answer()
+
+
 # ----------------------------------------------------------------------
 # DELETE CONFIRMATION
 # ----------------------------------------------------------------------
@@ -407,18 +520,14 @@ async def handle_confirm_delete(callback: types.CallbackQuery, state: FSMContext
         await session.execute(delete(Schedule).where(Schedule.id == schedule_id))
         await session.commit()
 
+    notify_schedule_changed(schedule_id, None, is_active=False)
     logger.info(f"Schedule #{schedule_id} DELETED by admin {callback.from_user.id}")
 
     await callback.answer(f"Schedule #{schedule_id} deleted!", show_alert=True)
     
     # Go back to list
-    async with AsyncSessionLocal() as session:
-        result = await session.execute(
-            select(Schedule).options(selectinload(Schedule.batches)).order_by(Schedule.id.desc())
-        )
-        schedules = result.scalars().all()
-
-    if not schedules:
+    panel = await _management_panel()
+    if not panel:
         await callback.message.edit_text(
             "📭 <b>No Schedules Remaining</b>\n\n"
             "Use /schedule to create a new scheduled broadcast.",
@@ -426,20 +535,8 @@ async def handle_confirm_delete(callback: types.CallbackQuery, state: FSMContext
         )
         return
 
-    active_count = sum(1 for s in schedules if s.is_active)
-    paused_count = len(schedules) - active_count
-
-    await callback.message.edit_text(
-        f"📋 <b>Schedule Management</b>\n"
-        f"━━━━━━━━━━━━━━━━━━━━━━\n\n"
-        f"📊 <b>Statistics:</b>\n"
-        f"• Total: <code>{len(schedules)}</code>\n"
-        f"• Active: <code>{active_count}</code> ✅\n"
-        f"• Paused: <code>{paused_count}</code> ⏸️\n\n"
-        f"👇 Select a schedule to manage:",
-        reply_markup=get_schedule_list_keyboard(schedules, page=0),
-        parse_mode="HTML"
-    )
+    text, keyboard = panel
+    await callback.message.edit_text(text, reply_markup=keyboard, parse_mode="HTML")
 
 
 # ----------------------------------------------------------------------
@@ -460,6 +557,7 @@ async def cmd_pause_schedule(message: types.Message):
                 return
             await session.execute(update(Schedule).where(Schedule.id == sched_id).values(is_active=False))
             await session.commit()
+        notify_schedule_changed(sched_id, None, is_active=False)
         logger.info(f"Schedule #{sched_id} paused by admin {message.from_user.id}")
         await message.answer(f"⏸️ Schedule <b>#{sched_id}</b> paused.", parse_mode="HTML")
     except (IndexError, ValueError):
@@ -484,6 +582,7 @@ async def cmd_resume_schedule(message: types.Message):
                 return
             await session.execute(update(Schedule).where(Schedule.id == sched_id).values(is_active=True))
             await session.commit()
+        notify_schedule_changed(sched_id, sched.next_run)
         logger.info(f"Schedule #{sched_id} resumed by admin {message.from_user.id}")
         await message.answer(f"▶️ Schedule <b>#{sched_id}</b> resumed.", parse_mode="HTML")
     except (IndexError, ValueError):
@@ -513,6 +612,7 @@ async def cmd_delete_schedule(message: types.Message):
             )
             await session.execute(delete(Schedule).where(Schedule.id == sched_id))
             await session.commit()
+        notify_schedule_changed(sched_id, None, is_active=False)
         logger.info(f"Schedule #{sched_id} DELETED by admin {message.from_user.id}")
         await message.answer(f"🗑️ Schedule <b>#{sched_id}</b> deleted permanently.", parse_mode="HTML")
     except (IndexError, ValueError):
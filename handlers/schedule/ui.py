@@ -1,18 +1,29 @@
 # handlers/schedule/ui.py
 """UI components for schedule management (calendar, time picker, navigation)."""
 from aiogram import types, F
-from datetime import datetime
+from datetime import datetime, date
+from functools import lru_cache
 import calendar
 from loader import dp
+from keyboard.inline import KEYBOARD_CACHE_SIZE
 from .helpers import ensure_user_exists
 
+_calendar_today: date | None = None  # day the cached calendars were drawn on
 
-def create_calendar(year: int | None = None, month: int | None = None):
-    """Create an interactive calendar widget."""
-    now = datetime.utcnow()
-    year = year or now.year
-    month = month or now.month
 
+def create_calendar(year: int | None = None, month: int | None = None):
+    """Create an interactive calendar widget (memoized per month until the UTC day rolls over)."""
+    global _calendar_today
+    today = datetime.utcnow().date()
+    if today != _calendar_today:
+        # Every cached month marks the old "today"
+        _calendar.cache_clear()
+        _calendar_today = today
+    return _calendar(year or today.year, month or today.month, today)
+
+
+@lru_cache(maxsize=KEYBOARD_CACHE_SIZE)
+def _calendar(year: int, month: int, today: date) -> types.InlineKeyboardMarkup:
     inline = []
     month_names = ["Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"]
     prev = types.InlineKeyboardButton(text="◀️ Previous", callback_data=f"cal_prev_{year}_{month}")
@@ -30,13 +41,14 @@ def create_calendar(year: int | None = None, month: int | None = None):
             if day == 0:
                 row.append(types.InlineKeyboardButton(text=" ", callback_data="ignore"))
             else:
-                txt = f"*{day}" if datetime(year, month, day).date() == now.date() else str(day)
+                txt = f"*{day}" if date(year, month, day) == today else str(day)
                 row.append(types.InlineKeyboardButton(text=txt, callback_data=f"cal_day_{year}_{month}_{day}"))
         inline.append(row)
 
     return types.InlineKeyboardMarkup(inline_keyboard=inline)
 
 
+@lru_cache(maxsize=1)
 def create_time_picker():
     """Create a 12-hour time picker widget."""
     inline = []
@@ -1,16 +1,18 @@
 from db.session import AsyncSessionLocal
 from db.models import Batch
 from sqlalchemy import select
+from services.batches import batch_registry
 
 BATCHES = ["1st Year", "2nd Year", "3rd Year", "4th Year","5th Year", "6th Year"]
 
 
 
 async def seed_batches():
-    """Ensure all batches exist in the DB."""
+    """Ensure all batches exist in the DB, then (re)load the in-memory registry."""
     async with AsyncSessionLocal() as session:
         for name in BATCHES:
             result = await session.execute(select(Batch).where(Batch.name == name))
             if not result.scalar_one_or_none():
                 session.add(Batch(name=name))
         await session.commit()
+    await batch_registry.load()
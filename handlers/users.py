@@ -9,8 +9,10 @@ from sqlalchemy import select
 
 from loader import dp
 from db.session import AsyncSessionLocal
-from db.models import User, Batch
+from db.models import User
 from config import SUPER_ADMIN_ID
+from services.admin_services import invalidate_user
+from services.batches import batch_registry
 
 
 # ──────────────────────────────────────────────────────────────
@@ -29,9 +31,8 @@ class EditProfileStates(StatesGroup):
 
 
 # ──────────────────────────────────────────────────────────────
-# BATCH CONFIG (MATCH startup.py)
+# PROFILE OPTIONS (batch names come from batch_registry, seeded in startup.py)
 # ──────────────────────────────────────────────────────────────
-BATCHES = ["1st Year", "2nd Year", "3rd Year", "4th Year", "5th Year", "6th Year"]
 GENDERS = ["Male", "Female"]
 
 
@@ -49,11 +50,7 @@ def create_gender_keyboard():
 
 def create_batch_keyboard():
     """Return one-time keyboard with all batches."""
-    return ReplyKeyboardMarkup(
-        keyboard=[[KeyboardButton(text=name)] for name in BATCHES],
-        resize_keyboard=True,
-        one_time_keyboard=True
-    )
+    return batch_registry.reply_keyboard()
 
 
 # ──────────────────────────────────────────────────────────────
@@ -79,6 +76,12 @@ async def cmd_start(message: types.Message, state: FSMContext):
             session.add(user)
             await session.commit()
             await session.refresh(user)
+            invalidate_user(user_id)
+        elif not user.is_reachable:
+            # Messaging us again means they unblocked the bot
+            user.is_reachable = True
+            user.unreachable_since = None
+            await session.commit()
 
         # ───── ADMIN GREETING ─────
         if user.is_admin:
@@ -117,10 +120,7 @@ async def cmd_start(message: types.Message, state: FSMContext):
             return
 
         # ───── FULLY REGISTERED USER ─────
-        batch_result = await session.execute(
-            select(Batch.name).where(Batch.id == user.batch_id)
-        )
-        batch_name = batch_result.scalar_one()
+        batch_name = batch_registry.name(user.batch_id)
 
         await message.answer(
             f"Welcome back, <b>{user.full_name}</b>! 👋\n\n"
@@ -218,10 +218,7 @@ async def cmd_my_batch(message: types.Message):
             )
             return
 
-        batch_result = await session.execute(
-            select(Batch.name).where(Batch.id == user.batch_id)
-        )
-        batch_name = batch_result.scalar_one()
+        batch_name = batch_registry.name(user.batch_id)
 
         await message.answer(
             f"Your current batch: <b>{batch_name}</b>\n\n"
@@ -260,20 +257,12 @@ async def cmd_edit_batch(message: types.Message, state: FSMContext):
 async def process_batch_selection(message: types.Message, state: FSMContext):
     selected_name = message.text.strip()
 
-    if selected_name not in BATCHES:
+    batch_id = batch_registry.id_for(selected_name)
+    if batch_id is None:
         await message.answer("Please select a valid batch from the keyboard.")
         return
 
     async with AsyncSessionLocal() as session:
-        batch_result = await session.execute(
-            select(Batch).where(Batch.name == selected_name)
-        )
-        batch = batch_result.scalar_one_or_none()
-
-        if not batch:
-            await message.answer("Batch not found. Try again.")
-            return
-
         user_result = await session.execute(
             select(User).where(User.user_id == message.from_user.id)
         )
@@ -281,7 +270,7 @@ async def process_batch_selection(message: types.Message, state: FSMContext):
 
         from sqlalchemy import update
         await session.execute(
-            update(User).where(User.user_id == message.from_user.id).values(batch_id=batch.id)
+            update(User).where(User.user_id == message.from_user.id).values(batch_id=batch_id)
         )
         await session.commit()
 
@@ -289,7 +278,7 @@ async def process_batch_selection(message: types.Message, state: FSMContext):
             f"🎉 <b>Registration Complete!</b>\n\n"
             f"👤 Name: <b>{user.full_name}</b>\n"
             f"⚧ Gender: {user.gender}\n"
-            f"📚 Batch: <b>{batch.name}</b>\n\n"
+            f"📚 Batch: <b>{selected_name}</b>\n\n"
             "You're all set! You'll now receive notifications for your batch.",
             reply_markup=ReplyKeyboardRemove(),
             parse_mode="HTML"
@@ -312,12 +301,7 @@ async def cmd_my_profile(message: types.Message):
             await message.answer("Use /start first.")
             return
 
-        batch_name = "Not selected"
-        if user.batch_id:
-            batch_result = await session.execute(
-                select(Batch.name).where(Batch.id == user.batch_id)
-            )
-            batch_name = batch_result.scalar_one()
+        batch_name = batch_registry.name(user.batch_id) or "Not selected"
 
         await message.answer(
             f"👤 <b>Your Profile</b>\n\n"
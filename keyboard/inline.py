@@ -1,22 +1,47 @@
 # keyboard/inline.py
 from aiogram import types
 from db.models import Batch, Schedule
+from functools import lru_cache
 from typing import List, Optional
 
+# ==============================================================================
+# CONFIGURATION
+# ==============================================================================
+KEYBOARD_CACHE_SIZE = 256  # Markups kept per keyboard builder (LRU)
+
+# Builders below marked @lru_cache return one shared markup per distinct input.
+# aiogram models are frozen; callers must not mutate the button lists either.
+
+
+def _batch_options(batches: list[Batch]) -> tuple[tuple[int, str], ...]:
+    return tuple((b.id, b.name) for b in batches)
+
+
+def _selected_mask(options: tuple[tuple[int, str], ...], selected) -> int:
+    """Bit i set when options[i] is selected: a cheap, hashable key for the selection."""
+    selected = set(selected or ())
+    return sum(1 << i for i, (batch_id, _) in enumerate(options) if batch_id in selected)
+
+
 # ==============================================================================
 # BATCH SELECTION KEYBOARDS
 # ==============================================================================
 
 def get_batch_keyboard(batches: list[Batch], selected: list[int] | None = None):
     """Keyboard for selecting batches during schedule creation."""
-    selected = selected or []
+    options = _batch_options(batches)
+    return _batch_keyboard(options, _selected_mask(options, selected))
+
+
+@lru_cache(maxsize=KEYBOARD_CACHE_SIZE)
+def _batch_keyboard(options: tuple[tuple[int, str], ...], mask: int) -> types.InlineKeyboardMarkup:
     buttons = []
-    for b in batches:
-        prefix = "✅" if b.id in selected else "⬜"
+    for i, (batch_id, name) in enumerate(options):
+        prefix = "✅" if mask >> i & 1 else "⬜"
         buttons.append([
             types.InlineKeyboardButton(
-                text=f"{prefix} {b.name}",
-                callback_data=f"batch_{b.id}"
+                text=f"{prefix} {name}",
+                callback_data=f"batch_{batch_id}"
             )
         ])
     buttons.append([
@@ -25,6 +50,7 @@ def get_batch_keyboard(batches: list[Batch], selected: list[int] | None = None):
     return types.InlineKeyboardMarkup(inline_keyboard=buttons)
 
 
+@lru_cache(maxsize=1)
 def get_schedule_type_keyboard():
     """Keyboard for selecting schedule type."""
     return types.InlineKeyboardMarkup(inline_keyboard=[
@@ -41,23 +67,20 @@ def get_schedule_type_keyboard():
 def get_schedule_list_keyboard(
     schedules: List[Schedule], 
     page: int = 0, 
-    per_page: int = 5
+    total_pages: int = 1
 ) -> types.InlineKeyboardMarkup:
     """
-    Generate paginated schedule list with action buttons.
+    Schedule list page with action buttons.
     
     Args:
-        schedules: List of Schedule objects
+        schedules: The schedules on this page, newest first
         page: Current page (0-indexed)
-        per_page: Items per page
+        total_pages: Number of pages, for the page counter
     """
     buttons = []
-    total_pages = max(1, (len(schedules) + per_page - 1) // per_page)
-    start_idx = page * per_page
-    end_idx = min(start_idx + per_page, len(schedules))
     
     # Schedule items for current page
-    for sched in schedules[start_idx:end_idx]:
+    for sched in schedules:
         status_emoji = "🟢" if sched.is_active else "⏸️"
         
         # Determine content for preview
@@ -91,11 +114,12 @@ def get_schedule_list_keyboard(
         ])
     
     # Pagination row
+    # Keyset cursors: the page before starts after our first id, the next one before our last
     nav_row = []
-    if page > 0:
+    if page > 0 and schedules:
         nav_row.append(types.InlineKeyboardButton(
             text="◀️ Prev", 
-            callback_data=f"sched_page_{page - 1}"
+            callback_data=f"sched_page_{page - 1}_gt_{schedules[0].id}"
         ))
     
     nav_row.append(types.InlineKeyboardButton(
@@ -103,10 +127,10 @@ def get_schedule_list_keyboard(
         callback_data="ignore"
     ))
     
-    if page < total_pages - 1:
+    if page < total_pages - 1 and schedules:
         nav_row.append(types.InlineKeyboardButton(
             text="Next ▶️", 
-            callback_data=f"sched_page_{page + 1}"
+            callback_data=f"sched_page_{page + 1}_lt_{schedules[-1].id}"
         ))
     
     if nav_row:
@@ -123,6 +147,7 @@ def get_schedule_list_keyboard(
     return types.InlineKeyboardMarkup(inline_keyboard=buttons)
 
 
+@lru_cache(maxsize=KEYBOARD_CACHE_SIZE)
 def get_schedule_actions_keyboard(
     schedule_id: int, 
     is_active: bool
@@ -148,8 +173,12 @@ def get_schedule_actions_keyboard(
                 callback_data=f"sched_toggle_{schedule_id}"
             ),
         ],
-        # Delete row
+        # Report / delete row
         [
+            types.InlineKeyboardButton(
+                text="📊 Delivery Report",
+                callback_data=f"sched_report_{schedule_id}"
+            ),
             types.InlineKeyboardButton(
                 text="🗑️ Delete",
                 callback_data=f"sched_delete_{schedule_id}"
@@ -167,6 +196,24 @@ def get_schedule_actions_keyboard(
     return types.InlineKeyboardMarkup(inline_keyboard=buttons)
 
 
+@lru_cache(maxsize=KEYBOARD_CACHE_SIZE)
+def get_delivery_report_keyboard(schedule_id: int) -> types.InlineKeyboardMarkup:
+    """Refresh/back buttons under a schedule's delivery report."""
+    return types.InlineKeyboardMarkup(inline_keyboard=[
+        [
+            types.InlineKeyboardButton(
+                text="🔄 Refresh",
+                callback_data=f"sched_report_{schedule_id}"
+            ),
+            types.InlineKeyboardButton(
+                text="◀️ Back",
+                callback_data=f"sched_view_{schedule_id}"
+            ),
+        ]
+    ])
+
+
+@lru_cache(maxsize=KEYBOARD_CACHE_SIZE)
 def get_edit_options_keyboard(schedule_id: int) -> types.InlineKeyboardMarkup:
     """Edit options menu for a schedule."""
     buttons = [
@@ -205,6 +252,7 @@ def get_edit_options_keyboard(schedule_id: int) -> types.InlineKeyboardMarkup:
     return types.InlineKeyboardMarkup(inline_keyboard=buttons)
 
 
+@lru_cache(maxsize=KEYBOARD_CACHE_SIZE)
 def get_confirm_delete_keyboard(schedule_id: int) -> types.InlineKeyboardMarkup:
     """Confirmation dialog for deleting a schedule."""
     buttons = [
@@ -231,13 +279,23 @@ def get_edit_batch_keyboard(
     schedule_id: int
 ) -> types.InlineKeyboardMarkup:
     """Keyboard for editing batches of an existing schedule."""
+    options = _batch_options(batches)
+    return _edit_batch_keyboard(options, _selected_mask(options, selected), schedule_id)
+
+
+@lru_cache(maxsize=KEYBOARD_CACHE_SIZE)
+def _edit_batch_keyboard(
+    options: tuple[tuple[int, str], ...],
+    mask: int,
+    schedule_id: int
+) -> types.InlineKeyboardMarkup:
     buttons = []
-    for b in batches:
-        prefix = "✅" if b.id in selected else "⬜"
+    for i, (batch_id, name) in enumerate(options):
+        prefix = "✅" if mask >> i & 1 else "⬜"
         buttons.append([
             types.InlineKeyboardButton(
-                text=f"{prefix} {b.name}",
-                callback_data=f"edit_batch_sel_{schedule_id}_{b.id}"
+                text=f"{prefix} {name}",
+                callback_data=f"edit_batch_sel_{schedule_id}_{batch_id}"
             )
         ])
     buttons.append([
@@ -253,6 +311,7 @@ def get_edit_batch_keyboard(
     return types.InlineKeyboardMarkup(inline_keyboard=buttons)
 
 
+@lru_cache(maxsize=KEYBOARD_CACHE_SIZE)
 def get_cancel_keyboard(schedule_id: int) -> types.InlineKeyboardMarkup:
     """Simple cancel button to go back to schedule view."""
     return types.InlineKeyboardMarkup(inline_keyboard=[
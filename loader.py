@@ -1,10 +1,21 @@
 from aiogram import Bot, Dispatcher
 from aiogram.enums import ParseMode
 from aiogram.client.default import DefaultBotProperties
-from config import BOT_TOKEN
+from aiogram.fsm.storage.memory import MemoryStorage
+from config import BOT_TOKEN, FSM_STORAGE
+from services.fsm_storage import PostgresStorage
+from middlewares import ConcurrencyLimitMiddleware
 
 bot = Bot(
     token=BOT_TOKEN,
     default=DefaultBotProperties(parse_mode=ParseMode.HTML)
 )
-dp = Dispatcher()
+dp = Dispatcher(storage=MemoryStorage() if FSM_STORAGE == "memory" else PostgresStorage())
+
+# Bounds concurrent handlers (and so DB sessions); queue depth and waits are in /metrics.
+# It must run before the FSM middleware, whose get_state is a query with PostgresStorage,
+# and after UserContextMiddleware, which provides event_from_user for the priority.
+concurrency_limit = ConcurrencyLimitMiddleware()
+dp.update.outer_middleware.unregister(dp.fsm)
+dp.update.outer_middleware(concurrency_limit)
+dp.update.outer_middleware(dp.fsm)
@@ -1,12 +1,18 @@
 # main.py
 import asyncio
 import os
+import signal
 from aiohttp import web
-from loader import bot, dp
+from aiogram.webhook.aiohttp_server import setup_application
+from loader import bot, dp, concurrency_limit
+from config import WEBHOOK_URL, WEBHOOK_PATH, WEBHOOK_SECRET
 import handlers.users
 import handlers.admin
 import handlers.schedule
 from handlers.startup import seed_batches
+from services.webhook import WebhookRequestHandler, WEBHOOK_MAX_CONNECTIONS
+
+webhook_handler = WebhookRequestHandler(dp, bot, secret_token=WEBHOOK_SECRET) if WEBHOOK_URL else None
 
 async def health_check(request):
     return web.Response(text="Bot is alive!", status=200)
@@ -14,24 +20,62 @@ async def health_check(request):
 async def ping(request):
     return web.Response(text="Pong!", status=200)
 
+async def metrics(request):
+    from services import scheduler, admin_services
+    stats = scheduler.broadcast_manager.stats() if scheduler.broadcast_manager else {}
+    stats["runs"] = scheduler.run_progress()
+    stats["admin_cache"] = admin_services.admin_flags.stats()
+    if hasattr(dp.storage, "stats"):
+        stats["fsm"] = dp.storage.stats()
+    stats["handlers"] = concurrency_limit.stats()
+    if webhook_handler:
+        stats["webhook"] = webhook_handler.stats()
+    return web.json_response(stats)
+
 async def start_web_server():
     app = web.Application()
     app.router.add_get("/", health_check)
 
     app.router.add_get("/ping", ping)
+    app.router.add_get("/metrics", metrics)
+    if webhook_handler:
+        webhook_handler.register(app, path=WEBHOOK_PATH)
+        # Runs dp startup/shutdown (FSM storage flush) with the app
+        setup_application(app, dp, bot=bot)
     runner = web.AppRunner(app)
     await runner.setup()
     port = int(os.getenv("PORT", 8080))
     site = web.TCPSite(runner, "0.0.0.0", port)
     await site.start()
     print(f"Web server started on port {port}")
+    return runner
+
+async def stop_broadcasts():
+    """Write the delivery ledger before exit, or recorded sends are repeated after the lease."""
+    from services import scheduler
+    if scheduler.broadcast_manager:
+        await scheduler.broadcast_manager.stop()
+
+# Runs when polling returns and, in webhook mode, on runner cleanup (setup_application)
+dp.shutdown.register(stop_broadcasts)
+
+async def wait_for_stop_signal():
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except NotImplementedError:
+            pass  # Windows: Ctrl+C still raises KeyboardInterrupt
+    await stop.wait()
 
 async def main():
     from services.scheduler import scheduler_loop
+    from services.admin_services import user_change_listener
     from utils.set_bot_commands import set_default_commands, set_admin_commands
     
-    # 1. Start Web Server (for Render/UptimeRobot)
-    await start_web_server()
+    # 1. Start Web Server (for Render/UptimeRobot, and the webhook)
+    runner = await start_web_server()
     
     # 2. Seed Data
     await seed_batches()
@@ -42,13 +86,28 @@ async def main():
     
     # 4. Start Scheduler
     asyncio.create_task(scheduler_loop(bot))
+    asyncio.create_task(user_change_listener())
     
     print("Bot starting...")
     
-    # 5. Start Polling
-    # Drop pending updates to prevent conflict on restart
-    await bot.delete_webhook(drop_pending_updates=True)
-    await dp.start_polling(bot)
+    # 5. Receive updates. Either way, updates queued during a deploy are kept.
+    if webhook_handler:
+        await bot.set_webhook(
+            f"{WEBHOOK_URL}{WEBHOOK_PATH}",
+            secret_token=WEBHOOK_SECRET,
+            allowed_updates=dp.resolve_used_update_types(),
+            max_connections=WEBHOOK_MAX_CONNECTIONS,
+        )
+        webhook_handler.accepting = True
+        print(f"Receiving updates by webhook at {WEBHOOK_URL}{WEBHOOK_PATH}")
+        try:
+            await wait_for_stop_signal()
+        finally:
+            await stop_broadcasts()
+            await runner.cleanup()
+    else:
+        await bot.delete_webhook(drop_pending_updates=False)
+        await dp.start_polling(bot)
 
 if __name__ == "__main__":
     asyncio.run(main())
\ No newline at end of file
@@ -0,0 +1,5 @@
+# middlewares/__init__.py
+"""Dispatcher middlewares, registered in loader.py."""
+from .concurrency import ConcurrencyLimitMiddleware
+
+__all__ = ["ConcurrencyLimitMiddleware"]
@@ -0,0 +1,154 @@
+# middlewares/concurrency.py
+"""
+Bounds how many updates are handled at once.
+
+Every handler opens its own DB session, and the pool holds 5 + 10
+connections (db/session.py). Without a bound, a registration rush starts
+hundreds of handlers that all wait on pool_timeout and time out together.
+Here at most HANDLER_CONCURRENCY updates run; the rest queue by priority
+(admins first, then button taps, then messages) and are shed with a short
+"busy" reply when the queue is full or they waited too long.
+"""
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.exceptions import TelegramAPIError
+from aiogram.types import Update
+
+from config import SUPER_ADMIN_ID
+from services.admin_services import admin_flags
+
+logger = logging.getLogger(__name__)
+
+# ==============================================================================
+# CONFIGURATION
+# ==============================================================================
+HANDLER_CONCURRENCY = 10    # Updates handled at once; leaves pool connections for the scheduler
+MAX_QUEUED = 500            # Queued updates beyond which non-admin updates are shed
+MAX_QUEUE_WAIT = 30         # Seconds a non-admin update may wait before it is shed
+WAIT_SAMPLES = 1000         # Recent queue waits kept for the percentiles in /metrics
+
+PRIORITY_ADMIN = 0
+PRIORITY_CALLBACK = 1
+PRIORITY_MESSAGE = 2
+_PRIORITY_NAMES = {PRIORITY_ADMIN: "admin", PRIORITY_CALLBACK: "callback", PRIORITY_MESSAGE: "message"}
+
+BUSY_TEXT = "⏳ The bot is very busy right now. Please try again in a minute."
+
+
+class PrioritySemaphore:
+    """
+    Semaphore whose waiters are woken lowest priority value first (FIFO within
+    a priority). A release hands the slot straight to the next waiter.
+    """
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.active = 0
+        self._waiters = []              # heap of (priority, seq, future)
+        self._seq = itertools.count()
+
+    def queued(self, priority: int | None = None) -> int:
+        return sum(
+            1 for p, _, fut in self._waiters
+            if not fut.done() and (priority is None or p == priority)
+        )
+
+    async def acquire(self, priority: int):
+        if self.active < self.limit and not self._waiters:
+            self.active += 1
+            return
+        fut = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._seq), fut))
+        try:
+            await fut
+        except asyncio.CancelledError:
+            if fut.done() and not fut.cancelled():
+                self.release()  # woken and cancelled in the same tick: pass the slot on
+            raise
+
+    def release(self):
+        while self._waiters:
+            _, _, fut = heapq.heappop(self._waiters)
+            if not fut.done():
+                fut.set_result(None)  # slot handed over; active count unchanged
+                return
+        self.active -= 1
+
+
+class ConcurrencyLimitMiddleware(BaseMiddleware):
+    """Outer update middleware: queue by priority, shed under overload, export metrics."""
+
+    def __init__(self, limit: int = HANDLER_CONCURRENCY):
+        self.slots = PrioritySemaphore(limit)
+        self.handled = 0
+        self.shed = {name: 0 for name in _PRIORITY_NAMES.values()}
+        self.waits = deque(maxlen=WAIT_SAMPLES)
+
+    @staticmethod
+    def priority(update: Update, data: Dict[str, Any]) -> int:
+        user = data.get("event_from_user")
+        # Only admins already seen by ensure_user_exists are in the cache; others queue as users
+        if user and (user.id == SUPER_ADMIN_ID or admin_flags.peek(user.id)):
+            return PRIORITY_ADMIN
+        return PRIORITY_CALLBACK if update.callback_query else PRIORITY_MESSAGE
+
+    async def __call__(
+        self,
+        handler: Callable[[Update, Dict[str, Any]], Awaitable[Any]],
+        event: Update,
+        data: Dict[str, Any]
+    ) -> Any:
+        priority = self.priority(event, data)
+        if priority != PRIORITY_ADMIN and self.slots.queued() >= MAX_QUEUED:
+            return await self._shed(event, priority)
+
+        started = time.monotonic()
+        try:
+            if priority == PRIORITY_ADMIN:
+                await self.slots.acquire(priority)
+            else:
+                await asyncio.wait_for(self.slots.acquire(priority), timeout=MAX_QUEUE_WAIT)
+        except asyncio.TimeoutError:
+            return await self._shed(event, priority)
+        self.waits.append(time.monotonic() - started)
+
+        try:
+            return await handler(event, data)
+        finally:
+            self.handled += 1
+            self.slots.release()
+
+    async def _shed(self, update: Update, priority: int):
+        self.shed[_PRIORITY_NAMES[priority]] += 1
+        # Answering still costs an API call but no DB connection, and tells the user to retry
+        try:
+            if update.callback_query:
+                await update.callback_query.answer(BUSY_TEXT, show_alert=False)
+            elif update.message:
+                await update.message.answer(BUSY_TEXT)
+        except TelegramAPIError as e:
+            logger.warning(f"Could not send busy reply for update {update.update_id}: {e}")
+
+    def stats(self) -> dict:
+        """Queue depth, wait times (ms) and shed counts for the /metrics endpoint."""
+        waits = sorted(self.waits)
+
+        def percentile(q: float) -> float:
+            return round(waits[min(len(waits) - 1, int(q * len(waits)))] * 1000, 1) if waits else 0.0
+
+        return {
+            "limit": self.slots.limit,
+            "in_flight": self.slots.active,
+            "queued": {name: self.slots.queued(p) for p, name in _PRIORITY_NAMES.items()},
+            "handled": self.handled,
+            "shed": dict(self.shed),
+            "wait_ms_p50": percentile(0.5),
+            "wait_ms_p95": percentile(0.95),
+            "wait_ms_max": percentile(1.0),
+        }
@@ -0,0 +1,29 @@
+"""add outbox template fields
+
+Revision ID: a3c58e1f9d27
+Revises: f1b6d2e8a374
+Create Date: 2026-10-16 16:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a3c58e1f9d27'
+down_revision = 'f1b6d2e8a374'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Recipient fields for message template variables ({gender}, {batch}, {join_date})
+    op.add_column('broadcast_outbox', sa.Column('gender', sa.String(), nullable=True))
+    op.add_column('broadcast_outbox', sa.Column('batch_name', sa.String(), nullable=True))
+    op.add_column('broadcast_outbox', sa.Column('join_date', sa.DateTime(), nullable=True))
+
+
+def downgrade():
+    op.drop_column('broadcast_outbox', 'join_date')
+    op.drop_column('broadcast_outbox', 'batch_name')
+    op.drop_column('broadcast_outbox', 'gender')
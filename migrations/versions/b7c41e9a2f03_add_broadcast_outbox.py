@@ -0,0 +1,43 @@
+"""add broadcast outbox
+
+Revision ID: b7c41e9a2f03
+Revises: 8f3a2b1c5d7e
+Create Date: 2026-10-16 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7c41e9a2f03'
+down_revision = '8f3a2b1c5d7e'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Durable delivery queue: one row per (schedule run, user)
+    op.create_table(
+        'broadcast_outbox',
+        sa.Column('id', sa.BigInteger(), nullable=False),
+        sa.Column('schedule_id', sa.Integer(), nullable=False),
+        sa.Column('run_at', sa.DateTime(), nullable=False),
+        sa.Column('user_id', sa.BigInteger(), nullable=False),
+        sa.Column('full_name', sa.String(), nullable=True),
+        sa.Column('status', sa.String(length=16), nullable=False, server_default='PENDING'),
+        sa.Column('attempts', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('next_attempt_at', sa.DateTime(), nullable=False, server_default=sa.func.now()),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['schedule_id'], ['schedules.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('schedule_id', 'run_at', 'user_id', name='uq_broadcast_outbox_run_user'),
+    )
+
+    # Workers claim by status + due time
+    op.create_index('ix_broadcast_outbox_claim', 'broadcast_outbox', ['status', 'next_attempt_at'])
+
+
+def downgrade():
+    op.drop_index('ix_broadcast_outbox_claim', table_name='broadcast_outbox')
+    op.drop_table('broadcast_outbox')
@@ -0,0 +1,49 @@
+"""add audience and schedule indexes
+
+Revision ID: b8e24f6a0c13
+Revises: a3c58e1f9d27
+Create Date: 2026-10-17 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b8e24f6a0c13'
+down_revision = 'a3c58e1f9d27'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # CONCURRENTLY cannot run inside a transaction; building these must not
+    # block registrations or running broadcasts on a live users table
+    with op.get_context().autocommit_block():
+        # Audience pages: WHERE batch_id = ? AND id > ? ORDER BY id LIMIT n,
+        # answered from the index alone (index-only scan)
+        op.create_index(
+            'ix_users_batch_audience', 'users', ['batch_id', 'id'],
+            postgresql_include=['user_id', 'full_name', 'gender', 'join_date', 'is_reachable', 'unreachable_since'],
+            postgresql_concurrently=True,
+        )
+        # Timer reconcile: only active schedules, in next_run order
+        op.create_index(
+            'ix_schedules_active_next_run', 'schedules', ['next_run'],
+            postgresql_include=['id'],
+            postgresql_where=sa.text('is_active'),
+            postgresql_concurrently=True,
+        )
+        # Batch -> schedules lookups and FK checks when batches change (the PK leads with schedule_id)
+        op.create_index(
+            'ix_schedule_batch_association_batch_id', 'schedule_batch_association', ['batch_id'],
+            postgresql_include=['schedule_id'],
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_schedule_batch_association_batch_id', table_name='schedule_batch_association', postgresql_concurrently=True)
+        op.drop_index('ix_schedules_active_next_run', table_name='schedules', postgresql_concurrently=True)
+        op.drop_index('ix_users_batch_audience', table_name='users', postgresql_concurrently=True)
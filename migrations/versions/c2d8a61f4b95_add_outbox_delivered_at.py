@@ -0,0 +1,26 @@
+"""add delivered_at to broadcast outbox
+
+Revision ID: c2d8a61f4b95
+Revises: b7c41e9a2f03
+Create Date: 2026-10-16 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c2d8a61f4b95'
+down_revision = 'b7c41e9a2f03'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Outcome timestamp for per-run delivery reports (status 'BLOCKED' needs no DDL)
+    op.add_column('broadcast_outbox', sa.Column('delivered_at', sa.DateTime(), nullable=True))
+
+
+def downgrade():
+    op.execute("UPDATE broadcast_outbox SET status = 'FAILED' WHERE status = 'BLOCKED'")
+    op.drop_column('broadcast_outbox', 'delivered_at')
@@ -0,0 +1,27 @@
+"""add user reachability
+
+Revision ID: d95e3b07c1a8
+Revises: c2d8a61f4b95
+Create Date: 2026-10-16 13:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd95e3b07c1a8'
+down_revision = 'c2d8a61f4b95'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Users whose chat is blocked/deleted are skipped by broadcasts until re-probed
+    op.add_column('users', sa.Column('is_reachable', sa.Boolean(), nullable=False, server_default='true'))
+    op.add_column('users', sa.Column('unreachable_since', sa.DateTime(), nullable=True))
+
+
+def downgrade():
+    op.drop_column('users', 'unreachable_since')
+    op.drop_column('users', 'is_reachable')
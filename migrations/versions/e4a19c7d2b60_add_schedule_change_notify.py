@@ -0,0 +1,50 @@
+"""add schedule change notify trigger
+
+Revision ID: e4a19c7d2b60
+Revises: d95e3b07c1a8
+Create Date: 2026-10-16 14:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'e4a19c7d2b60'
+down_revision = 'd95e3b07c1a8'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Every committed write to schedules is published on the "schedule_changes"
+    # channel so running bot processes can update their timers without polling
+    op.execute("""
+        CREATE OR REPLACE FUNCTION notify_schedule_change() RETURNS trigger AS $$
+        DECLARE
+            rec schedules%ROWTYPE;
+        BEGIN
+            IF TG_OP = 'DELETE' THEN
+                rec := OLD;
+            ELSE
+                rec := NEW;
+            END IF;
+            PERFORM pg_notify('schedule_changes', json_build_object(
+                'op', TG_OP,
+                'id', rec.id,
+                'next_run', rec.next_run,
+                'is_active', rec.is_active
+            )::text);
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+    """)
+    op.execute("""
+        CREATE TRIGGER schedules_notify_change
+        AFTER INSERT OR UPDATE OR DELETE ON schedules
+        FOR EACH ROW EXECUTE FUNCTION notify_schedule_change();
+    """)
+
+
+def downgrade():
+    op.execute("DROP TRIGGER IF EXISTS schedules_notify_change ON schedules")
+    op.execute("DROP FUNCTION IF EXISTS notify_schedule_change()")
@@ -0,0 +1,61 @@
+"""add schedule leases
+
+Revision ID: f1b6d2e8a374
+Revises: e4a19c7d2b60
+Create Date: 2026-10-16 15:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f1b6d2e8a374'
+down_revision = 'e4a19c7d2b60'
+branch_labels = None
+depends_on = None
+
+
+NOTIFY_FUNCTION = """
+    CREATE OR REPLACE FUNCTION notify_schedule_change() RETURNS trigger AS $$
+    DECLARE
+        rec schedules%ROWTYPE;
+    BEGIN
+        IF TG_OP = 'DELETE' THEN
+            rec := OLD;
+        ELSE
+            rec := NEW;
+        END IF;
+        {skip_unchanged}
+        PERFORM pg_notify('schedule_changes', json_build_object(
+            'op', TG_OP,
+            'id', rec.id,
+            'next_run', rec.next_run,
+            'is_active', rec.is_active
+        )::text);
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql;
+"""
+
+
+def upgrade():
+    # The instance currently executing a run and until when its claim is valid
+    op.add_column('schedules', sa.Column('lease_owner', sa.String(), nullable=True))
+    op.add_column('schedules', sa.Column('lease_expires_at', sa.DateTime(), nullable=True))
+
+    # Taking/releasing a lease must not wake every scheduler: only publish
+    # updates that move next_run or flip is_active
+    op.execute(NOTIFY_FUNCTION.format(skip_unchanged="""
+        IF TG_OP = 'UPDATE'
+           AND NEW.next_run IS NOT DISTINCT FROM OLD.next_run
+           AND NEW.is_active IS NOT DISTINCT FROM OLD.is_active THEN
+            RETURN NULL;
+        END IF;
+    """))
+
+
+def downgrade():
+    op.execute(NOTIFY_FUNCTION.format(skip_unchanged=""))
+    op.drop_column('schedules', 'lease_expires_at')
+    op.drop_column('schedules', 'lease_owner')
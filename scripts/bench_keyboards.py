@@ -0,0 +1,110 @@
+"""
+Benchmark for the memoized inline keyboards.
+
+Replays the callbacks an admin taps while creating a schedule (batch toggles,
+calendar prev/next, the time picker, the type picker) and reports the CPU
+per callback spent building the reply markup, uncached (the builder's
+__wrapped__ function) versus through the cache.
+
+Usage: python scripts/bench_keyboards.py [--callbacks 20000]
+"""
+import argparse
+import pathlib
+import random
+import sys
+import time
+
+# Ensure project root is on sys.path so sibling packages like `services` can be imported
+PROJECT_ROOT = pathlib.Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from keyboard import inline
+from handlers.schedule import ui
+
+
+class FakeBatch:
+    def __init__(self, id: int, name: str):
+        self.id = id
+        self.name = name
+
+
+BATCHES = [FakeBatch(i, name) for i, name in enumerate(
+    ["1st Year", "2nd Year", "3rd Year", "4th Year", "5th Year", "6th Year"], start=1
+)]
+
+
+def workload(n: int, seed: int = 7):
+    """(name, thunk) pairs, one per simulated callback, in a realistic mix."""
+    rng = random.Random(seed)
+    today = ui.datetime.utcnow().date()
+    calls = []
+    for _ in range(n):
+        kind = rng.random()
+        if kind < 0.5:
+            selected = [b.id for b in BATCHES if rng.random() < 0.3]
+            calls.append(("batch toggle", lambda s=selected: inline.get_batch_keyboard(BATCHES, s)))
+        elif kind < 0.8:
+            offset = rng.randint(0, 5)
+            year, month = today.year + (today.month - 1 + offset) // 12, (today.month - 1 + offset) % 12 + 1
+            calls.append(("calendar", lambda y=year, m=month: ui.create_calendar(y, m)))
+        elif kind < 0.95:
+            calls.append(("time picker", ui.create_time_picker))
+        else:
+            calls.append(("schedule type", inline.get_schedule_type_keyboard))
+    return calls
+
+
+def run(calls) -> dict[str, list[float]]:
+    per_kind: dict[str, list[float]] = {}
+    for name, thunk in calls:
+        start = time.perf_counter()
+        thunk()
+        per_kind.setdefault(name, []).append(time.perf_counter() - start)
+    return per_kind
+
+
+def uncached():
+    """Point the public builders at the raw functions for a baseline run."""
+    originals = {
+        (inline, "_batch_keyboard"): inline._batch_keyboard,
+        (ui, "_calendar"): ui._calendar,
+        (ui, "create_time_picker"): ui.create_time_picker,
+        (inline, "get_schedule_type_keyboard"): inline.get_schedule_type_keyboard,
+    }
+    for (module, attr), fn in originals.items():
+        raw = fn.__wrapped__
+        raw.cache_clear = lambda: None  # create_calendar clears on day rollover
+        setattr(module, attr, raw)
+    return originals
+
+
+def report(label: str, per_kind: dict[str, list[float]]):
+    total = sum(sum(v) for v in per_kind.values())
+    count = sum(len(v) for v in per_kind.values())
+    print(f"{label}: {total / count * 1e6:8.1f} us/callback over {count} callbacks")
+    for name, times in sorted(per_kind.items()):
+        print(f"  {name:14}: {sum(times) / len(times) * 1e6:8.1f} us  ({len(times)} calls)")
+    return total / count
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--callbacks", type=int, default=20_000)
+    args = parser.parse_args()
+
+    cached_us = report("cached", run(workload(args.callbacks)))
+
+    originals = uncached()
+    try:
+        uncached_us = report("uncached", run(workload(args.callbacks)))
+    finally:
+        for (module, attr), fn in originals.items():
+            setattr(module, attr, fn)
+
+    print(f"CPU saved per callback: {(uncached_us - cached_us) * 1e6:.1f} us "
+          f"({uncached_us / cached_us:.0f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+"""
+Benchmark harness for the global rate limiter.
+
+Simulates N workers hammering TokenBucket.acquire() and reports, for the
+lock-free timeline bucket and the previous lock-based bucket:
+  - achieved rate (must stay at or just under the configured rate)
+  - worst 1-second window (overshoot check against Telegram's 30 msg/s)
+  - jitter of the gaps between grants
+  - limiter + event loop CPU overhead per acquisition
+
+100k acquisitions at 29.5 msg/s would take ~1 hour of wall time, so the run
+uses an event loop with a virtual clock: instead of sleeping, the loop jumps
+straight to the next timer. Rates and gaps are exact in virtual seconds; CPU
+overhead is real.
+
+Usage: python scripts/bench_rate_limiter.py [--acquisitions 100000] [--workers 30] [--rate 29.5]
+"""
+import argparse
+import asyncio
+import pathlib
+import statistics
+import sys
+import time
+
+# Ensure project root is on sys.path so sibling packages like `services` can be imported
+PROJECT_ROOT = pathlib.Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from services.rate_limiter import TokenBucket
+
+
+class LockedTokenBucket:
+    """The previous implementation (asyncio.Lock + last_update reservation), kept as a baseline."""
+    def __init__(self, rate: float, clock=time.monotonic):
+        self.rate = rate
+        self.clock = clock
+        self.tokens = rate
+        self.last_update = clock()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self.lock:
+            now = self.clock()
+            elapsed = now - self.last_update
+            new_tokens = elapsed * self.rate
+            if new_tokens > 0:
+                self.tokens = min(self.rate, self.tokens + new_tokens)
+                self.last_update = now
+            if self.tokens >= 1.0:
+                self.tokens -= 1.0
+                return
+            wait_time = (1.0 - self.tokens) / self.rate
+            self.tokens = 0.0
+            self.last_update += wait_time
+        if wait_time > 0:
+            await asyncio.sleep(wait_time)
+
+
+class VirtualClockLoop(asyncio.SelectorEventLoop):
+    """Event loop whose clock jumps to the next scheduled timer instead of sleeping."""
+    def __init__(self):
+        super().__init__()
+        self._now = 0.0
+        select = self._selector.select
+
+        def _select(timeout=None):
+            if timeout:
+                self._now += timeout
+            return select(0)
+
+        self._selector.select = _select
+
+    def time(self) -> float:
+        return self._now
+
+
+async def run(bucket, clock, acquisitions: int, workers: int) -> list[float]:
+    grants = []
+    remaining = acquisitions
+
+    async def worker():
+        nonlocal remaining
+        while remaining > 0:
+            remaining -= 1
+            await bucket.acquire()
+            grants.append(clock())
+
+    await asyncio.gather(*(worker() for _ in range(workers)))
+    return grants
+
+
+def simulate(make_bucket, acquisitions: int, workers: int) -> tuple[list[float], float]:
+    loop = VirtualClockLoop()
+    try:
+        bucket = make_bucket(loop.time)
+        # Virtual sleeps cost nothing, so this is limiter + event loop overhead
+        start = time.process_time()
+        grants = loop.run_until_complete(run(bucket, loop.time, acquisitions, workers))
+        return grants, time.process_time() - start
+    finally:
+        loop.close()
+
+
+def report(name: str, grants: list[float], cpu: float, rate: float):
+    n = len(grants)
+    duration = grants[-1] - grants[0]
+    achieved = (n - 1) / duration if duration else float("inf")
+
+    # Worst 1-second window, two-pointer sweep over grant times
+    worst = 0
+    lo = 0
+    for hi, t in enumerate(grants):
+        while t - grants[lo] >= 1.0:
+            lo += 1
+        worst = max(worst, hi - lo + 1)
+
+    gaps = [(b - a) * 1000 for a, b in zip(grants, grants[1:])]
+
+    print(f"{name}")
+    print(f"  achieved rate     : {achieved:8.3f} msg/s (target {rate})")
+    print(f"  worst 1s window   : {worst:8d} msgs")
+    print(f"  gap mean / jitter : {statistics.fmean(gaps):8.2f} / {statistics.pstdev(gaps):.2f} ms")
+    print(f"  scheduler overhead: {cpu / n * 1e6:8.2f} us CPU per acquire")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--acquisitions", type=int, default=100_000)
+    parser.add_argument("--workers", type=int, default=30)
+    parser.add_argument("--rate", type=float, default=29.5)
+    args = parser.parse_args()
+
+    print(f"{args.acquisitions} acquisitions, {args.workers} workers, {args.rate} msg/s\n")
+
+    for name, make_bucket in (
+        ("timeline bucket (lock-free)", lambda clock: TokenBucket(rate=args.rate, clock=clock)),
+        ("locked bucket (previous)", lambda clock: LockedTokenBucket(rate=args.rate, clock=clock)),
+    ):
+        grants, cpu = simulate(make_bucket, args.acquisitions, args.workers)
+        report(name, grants, cpu, args.rate)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+"""
+EXPLAIN regression check for the audience and schedule indexes.
+
+Copies the migrated users / schedules tables (with all their indexes) into a
+scratch schema, fills them with synthetic rows (1M users by default), and
+asserts that the queries the scheduler actually issues are answered by
+index-only scans:
+
+  - audience_page_query: first and middle keyset page of one batch
+  - active_schedules_query: the timer reconcile
+
+Also checks that the indexes migration b8e24f6a0c13 built CONCURRENTLY are
+valid. Needs a database at `alembic upgrade head`. The scratch schema is dropped
+afterwards; nothing in public is touched.
+
+Usage: python scripts/check_index_plans.py [--users 1000000] [--schedules 20000] [--plans]
+Exit status is non-zero when a plan regresses.
+"""
+import argparse
+import asyncio
+import json
+import pathlib
+import sys
+from datetime import datetime
+
+# Ensure project root is on sys.path so sibling packages like `services` can be imported
+PROJECT_ROOT = pathlib.Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+import asyncpg
+from sqlalchemy.dialects.postgresql import asyncpg as pg_asyncpg
+
+from database import ASYNCPG_DSN
+from services.scheduler import audience_page_query, active_schedules_query, REPROBE_AFTER
+
+SCHEMA = "index_check"
+BATCHES = 6
+# Built CONCURRENTLY by b8e24f6a0c13; a failed concurrent build leaves the index INVALID and unused
+MIGRATED_INDEXES = ("ix_users_batch_audience", "ix_schedules_active_next_run", "ix_schedule_batch_association_batch_id")
+
+
+async def check_migrated_indexes(conn) -> bool:
+    rows = await conn.fetch(
+        """
+        SELECT c.relname, i.indisvalid, i.indisready
+        FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid
+        JOIN pg_namespace n ON n.oid = c.relnamespace
+        WHERE n.nspname = 'public' AND c.relname = ANY($1::text[])
+        """,
+        list(MIGRATED_INDEXES),
+    )
+    found = {r["relname"]: r["indisvalid"] and r["indisready"] for r in rows}
+    ok = True
+    for name in MIGRATED_INDEXES:
+        state = "valid" if found.get(name) else ("INVALID" if name in found else "MISSING")
+        print(f"  {name:40}: {state}")
+        ok &= state == "valid"
+    return ok
+
+
+async def build_fixture(conn, users: int, schedules: int):
+    await conn.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+    await conn.execute(f"CREATE SCHEMA {SCHEMA}")
+    for table in ("batches", "users", "schedules"):
+        # INCLUDING ALL copies the indexes exactly as the migrations created them
+        await conn.execute(f"CREATE TABLE {SCHEMA}.{table} (LIKE public.{table} INCLUDING ALL)")
+
+    await conn.execute(f"""
+        INSERT INTO {SCHEMA}.batches (id, name)
+        SELECT b, b || 'th Year' FROM generate_series(1, {BATCHES}) b
+    """)
+    # ~2% unreachable, spread evenly over the batches. Telegram-like ids that still fit
+    # users.user_id, which the migrations created as integer (the model says BIGINT)
+    await conn.execute(f"""
+        INSERT INTO {SCHEMA}.users (id, user_id, full_name, gender, is_admin, batch_id, join_date,
+                                    is_reachable, unreachable_since)
+        SELECT i, 1000000000 + i, 'Student ' || i, CASE WHEN i % 2 = 0 THEN 'Male' ELSE 'Female' END,
+               false, 1 + i % {BATCHES}, now() - (i % 700) * interval '1 day',
+               i % 50 <> 0, CASE WHEN i % 50 = 0 THEN now() - (i % 90) * interval '1 day' END
+        FROM generate_series(1, {users}) i
+    """)
+    # ~5% of schedules active, as in a deployment that keeps its history
+    await conn.execute(f"""
+        INSERT INTO {SCHEMA}.schedules (id, message, type, next_run, created_at, admin_id, is_active)
+        SELECT i, 'msg', 'WEEKLY', now() + (i % 1000) * interval '1 hour', now(), 1, i % 20 = 0
+        FROM generate_series(1, {schedules}) i
+    """)
+    # Index-only scans rely on the visibility map being current
+    for table in ("batches", "users", "schedules"):
+        await conn.execute(f"VACUUM ANALYZE {SCHEMA}.{table}")
+
+
+def _nodes(plan: dict):
+    yield plan
+    for child in plan.get("Plans", []):
+        yield from _nodes(child)
+
+
+async def explain(conn, stmt) -> dict:
+    compiled = stmt.compile(dialect=pg_asyncpg.dialect())
+    params = [compiled.params[name] for name in compiled.positiontup or ()]
+    raw = await conn.fetchval(f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {compiled.string}", *params)
+    return (json.loads(raw) if isinstance(raw, str) else raw)[0]
+
+
+def _format_plan(node: dict, depth: int = 0) -> list[str]:
+    rows = f"rows={node.get('Actual Rows')}"
+    line = "  " * depth + f"-> {node['Node Type']}"
+    if node.get("Index Name"):
+        line += f" using {node['Index Name']}"
+    if node.get("Index Cond"):
+        line += f" ({node['Index Cond']})"
+    lines = [f"{line}  [{rows}, heap fetches {node.get('Heap Fetches', '-')}]"]
+    for child in node.get("Plans", []):
+        lines += _format_plan(child, depth + 1)
+    return lines
+
+
+async def check(conn, name: str, stmt, table: str, show_plan: bool = False) -> bool:
+    result = await explain(conn, stmt)
+    if show_plan:
+        print("\n".join(f"      {line}" for line in _format_plan(result["Plan"])))
+    scans = [n for n in _nodes(result["Plan"]) if n.get("Relation Name") == table]
+    ok = bool(scans) and all(n["Node Type"] == "Index Only Scan" for n in scans)
+    for n in scans:
+        print(f"  {name:32}: {n['Node Type']} using {n.get('Index Name')} "
+              f"(heap fetches {n.get('Heap Fetches', '-')}), {result['Execution Time']:.2f} ms")
+    if not ok:
+        print(f"  {name:32}: REGRESSION, expected an Index Only Scan on {table}")
+    return ok
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=1_000_000)
+    parser.add_argument("--schedules", type=int, default=20_000)
+    parser.add_argument("--plans", action="store_true", help="print each EXPLAIN ANALYZE plan tree")
+    args = parser.parse_args()
+
+    conn = await asyncpg.connect(ASYNCPG_DSN)
+    try:
+        print("Migrated indexes:")
+        valid = await check_migrated_indexes(conn)
+        print(f"Building {args.users} users / {args.schedules} schedules in schema {SCHEMA}...")
+        await build_fixture(conn, args.users, args.schedules)
+        await conn.execute(f"SET search_path TO {SCHEMA}")
+
+        reprobe_before = datetime.utcnow() - REPROBE_AFTER
+        middle = args.users // 2
+        results = [
+            valid,
+            await check(conn, "audience page (first)", audience_page_query(1, 0, reprobe_before), "users", args.plans),
+            await check(conn, "audience page (middle)", audience_page_query(1, middle, reprobe_before), "users", args.plans),
+            await check(conn, "active schedules (reconcile)", active_schedules_query(), "schedules", args.plans),
+        ]
+    finally:
+        await conn.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+        await conn.close()
+
+    if not all(results):
+        sys.exit(1)
+    print("All plans use index-only scans.")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
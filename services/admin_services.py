@@ -1,12 +1,47 @@
 # services/admin_services.py
-from sqlalchemy import select, update, func
+from sqlalchemy import select, update, func, text
 from db.session import AsyncSessionLocal
 from db.models import User
+from database import listen
+from utils.cache import TTLCache
 import logging
 import asyncio
 
 logger = logging.getLogger(__name__)
 
+# ==============================================================================
+# CONFIGURATION
+# ==============================================================================
+ADMIN_CACHE_SIZE = 10000      # Telegram ids whose admin flag is kept in memory
+ADMIN_CACHE_TTL = 300         # Seconds before a cached flag is re-read (bounds staleness if a NOTIFY is missed)
+USER_CHANNEL = "user_changes"  # NOTIFY channel: Telegram id whose admin flag changed
+
+# Telegram user_id -> is_admin, for the permission check at the top of every admin handler
+admin_flags = TTLCache(ADMIN_CACHE_SIZE, ADMIN_CACHE_TTL)
+
+
+def invalidate_user(user_id: int):
+    """Forget a user's cached admin flag after writing to their row."""
+    admin_flags.invalidate(user_id)
+
+
+async def _notify_user_changed(session, user_id: int):
+    # Delivered on commit to every process's user_change_listener
+    await session.execute(text("SELECT pg_notify(:channel, :user_id)"), {"channel": USER_CHANNEL, "user_id": str(user_id)})
+
+
+async def user_change_listener():
+    """Drop cached admin flags changed by other bot processes."""
+    async def _resync():
+        admin_flags.clear()
+
+    await listen(
+        USER_CHANNEL,
+        lambda connection, pid, channel, payload: admin_flags.invalidate(int(payload)),
+        on_connect=_resync
+    )
+
+
 async def _execute_with_retry(query_func, max_retries=3):
     """Execute DB query with retry on connection loss"""
     for attempt in range(max_retries):
@@ -47,7 +82,9 @@ async def promote_user_to_admin(user: User) -> bool:
             .where(User.id == user.id)
             .values(is_admin=True)
         )
+        await _notify_user_changed(session, user.user_id)
         await session.commit()
+        invalidate_user(user.user_id)
         return True
 
     return await _execute_with_retry(_update)
@@ -62,7 +99,9 @@ async def demote_admin(user: User) -> bool:
             .where(User.id == user.id)
             .values(is_admin=False)
         )
+        await _notify_user_changed(session, user.user_id)
         await session.commit()
+        invalidate_user(user.user_id)
         return True
 
     return await _execute_with_retry(_update)
\ No newline at end of file
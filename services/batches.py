@@ -0,0 +1,61 @@
+# services/batches.py
+"""
+In-memory registry of the batches table.
+
+Batches are reference data: seeded once by handlers/startup.seed_batches and
+never edited by a handler. They are loaded at startup and reloaded after each
+seed, so handlers resolve ids and names without a query.
+"""
+import logging
+
+from aiogram.types import ReplyKeyboardMarkup, KeyboardButton
+from sqlalchemy import select
+
+from db.session import AsyncSessionLocal
+from db.models import Batch
+
+logger = logging.getLogger(__name__)
+
+
+class BatchRegistry:
+    """id <-> name lookups over detached Batch rows, plus the registration keyboard."""
+
+    def __init__(self):
+        self._batches: list[Batch] = []
+        self._by_id: dict[int, Batch] = {}
+        self._by_name: dict[str, Batch] = {}
+        self._reply_keyboard: ReplyKeyboardMarkup | None = None
+
+    async def load(self):
+        """(Re)read the table. Swaps in new lookups at once, so readers never see a partial state."""
+        async with AsyncSessionLocal() as session:
+            batches = (await session.execute(select(Batch).order_by(Batch.id))).scalars().all()
+        self._batches = list(batches)
+        self._by_id = {b.id: b for b in batches}
+        self._by_name = {b.name: b for b in batches}
+        self._reply_keyboard = None
+        logger.info(f"Batch registry loaded: {len(batches)} batches")
+
+    def all(self) -> list[Batch]:
+        return self._batches
+
+    def name(self, batch_id: int | None) -> str | None:
+        batch = self._by_id.get(batch_id)
+        return batch.name if batch else None
+
+    def id_for(self, name: str) -> int | None:
+        batch = self._by_name.get(name)
+        return batch.id if batch else None
+
+    def reply_keyboard(self) -> ReplyKeyboardMarkup:
+        """One-time keyboard with every batch name, built once per load."""
+        if self._reply_keyboard is None:
+            self._reply_keyboard = ReplyKeyboardMarkup(
+                keyboard=[[KeyboardButton(text=b.name)] for b in self._batches],
+                resize_keyboard=True,
+                one_time_keyboard=True
+            )
+        return self._reply_keyboard
+
+
+batch_registry = BatchRegistry()
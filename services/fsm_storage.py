@@ -0,0 +1,230 @@
+# services/fsm_storage.py
+"""
+aiogram FSM storage backed by the fsm_states table, so half-finished
+conversations survive restarts and are visible to every replica.
+
+Writes are coalesced: a handler typically calls update_data and set_state
+(and clear() is set_state + set_data), which become one upsert per key,
+flushed FSM_FLUSH_DELAY seconds later together with every other key written
+in the meantime. Reads see unflushed writes first, so a process never reads
+back older state than it wrote.
+
+aiogram reads the state of every update, so reads are cached per key for
+FSM_CACHE_TTL seconds, including keys that have no row (most users, most of
+the time). This process's own writes update the cache; the TTL bounds how
+long a write made by another replica can go unseen.
+"""
+import asyncio
+import enum
+import logging
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, StateType, StorageKey
+from sqlalchemy import select, delete
+from sqlalchemy.dialects.postgresql import insert
+
+from db.session import AsyncSessionLocal
+from db.models import FsmRecord, ScheduleType, OutboxStatus
+
+logger = logging.getLogger(__name__)
+
+# ==============================================================================
+# CONFIGURATION
+# ==============================================================================
+FSM_FLUSH_DELAY = 0.1    # Seconds writes are held to merge them (well under a human's next tap)
+FSM_RETRY_DELAY = 2.0    # Back-off before retrying a failed flush
+FSM_CACHE_TTL = 2.0      # Seconds a read or own write is served without a query (staleness across replicas)
+FSM_CACHE_SIZE = 10000   # Keys cached (LRU), including keys known to have no row
+
+# Enums that may appear in FSM data, by class name
+_ENUMS = {cls.__name__: cls for cls in (ScheduleType, OutboxStatus)}
+
+
+# ==============================================================================
+# SERIALIZATION
+# ==============================================================================
+# JSON plus two tagged forms: {"$dt": iso} for datetimes and {"$enum": name, "v": value}
+
+def _encode(value):
+    if isinstance(value, datetime):
+        return {"$dt": value.isoformat()}
+    if isinstance(value, enum.Enum):
+        return {"$enum": type(value).__name__, "v": value.value}
+    if isinstance(value, dict):
+        return {str(k): _encode(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_encode(v) for v in value]
+    return value
+
+
+def _decode(value):
+    if isinstance(value, dict):
+        if "$dt" in value and len(value) == 1:
+            return datetime.fromisoformat(value["$dt"])
+        if "$enum" in value and len(value) == 2:
+            return _ENUMS[value["$enum"]](value["v"])
+        return {k: _decode(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_decode(v) for v in value]
+    return value
+
+
+# ==============================================================================
+# STORAGE
+# ==============================================================================
+class PostgresStorage(BaseStorage):
+    def __init__(self, flush_delay: float = FSM_FLUSH_DELAY):
+        self.flush_delay = flush_delay
+        self._pending: dict[str, dict] = {}   # key -> {"state": ..., "data": ...} not yet written
+        self._flushing: dict[str, dict] = {}  # the batch being written right now
+        self._flush_task: asyncio.Task | None = None
+        self._lock = asyncio.Lock()           # one flush at a time keeps batches in order
+        self._cache: OrderedDict[str, tuple[float, dict]] = OrderedDict()  # key -> (time, fields)
+        self.reads = 0
+        self.cache_hits = 0
+        self.writes = 0
+        self.rows_written = 0
+        self.flushes = 0
+
+    @staticmethod
+    def _key(key: StorageKey) -> str:
+        parts = (key.bot_id, key.chat_id, key.user_id, key.thread_id, key.business_connection_id, key.destiny)
+        return ":".join("" if part is None else str(part) for part in parts)
+
+    def _unflushed(self, key: str, field: str):
+        """(True, value) if `field` of `key` was written but is not in the table yet."""
+        for batch in (self._pending, self._flushing):
+            fields = batch.get(key)
+            if fields and field in fields:
+                return True, fields[field]
+        return False, None
+
+    def _cached(self, key: str, field: str):
+        """(True, value) if `field` of `key` was read or written less than FSM_CACHE_TTL ago."""
+        entry = self._cache.get(key)
+        if entry is None or time.monotonic() - entry[0] > FSM_CACHE_TTL or field not in entry[1]:
+            return False, None
+        self._cache.move_to_end(key)
+        return True, entry[1][field]
+
+    def _remember(self, key: str, fields: dict):
+        now = time.monotonic()
+        entry = self._cache.get(key)
+        if entry is not None and now - entry[0] <= FSM_CACHE_TTL:
+            fields = {**entry[1], **fields}
+        self._cache[key] = (now, fields)
+        self._cache.move_to_end(key)
+        if len(self._cache) > FSM_CACHE_SIZE:
+            self._cache.popitem(last=False)
+
+    def _write(self, key: StorageKey, field: str, value):
+        k = self._key(key)
+        self._pending.setdefault(k, {})[field] = value
+        self._remember(k, {field: value})
+        self.writes += 1
+        if self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush_later(self.flush_delay))
+
+    async def _read(self, key: str, field: str):
+        """Value of `field`: unflushed write, then cache, then one query for the whole row."""
+        self.reads += 1
+        for lookup in (self._unflushed, self._cached):
+            found, value = lookup(key, field)
+            if found:
+                self.cache_hits += 1
+                return value
+        async with AsyncSessionLocal() as session:
+            row = (await session.execute(
+                select(FsmRecord.state, FsmRecord.data).where(FsmRecord.key == key)
+            )).one_or_none()
+        fields = {"state": row.state, "data": row.data} if row else {"state": None, "data": None}
+        # A write may have landed while we queried; it is newer than the row
+        for f in fields:
+            found, value = self._unflushed(key, f)
+            if found:
+                fields[f] = value
+        self._remember(key, fields)
+        return fields[field]
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        self._write(key, "state", state.state if isinstance(state, State) else state)
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        return await self._read(self._key(key), "state")
+
+    async def set_data(self, key: StorageKey, data: Dict[str, Any]) -> None:
+        # Encoded now: a snapshot, unaffected if the caller mutates the dict later
+        self._write(key, "data", _encode(data))
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        data = await self._read(self._key(key), "data")
+        return _decode(data) if data else {}
+
+    async def _flush_later(self, delay: float):
+        await asyncio.sleep(delay)
+        self._flush_task = None
+        await self.flush()
+
+    async def flush(self):
+        """Write every pending change in one transaction."""
+        async with self._lock:
+            if not self._pending:
+                return
+            batch, self._pending = self._pending, {}
+            self._flushing = batch
+            try:
+                await self._write_batch(batch)
+                self.flushes += 1
+                self.rows_written += len(batch)
+            except Exception as e:
+                logger.error(f"FSM flush of {len(batch)} keys failed, retrying: {e}")
+                # Keep the batch unless a newer write for the same field arrived meanwhile
+                for key, fields in batch.items():
+                    self._pending[key] = {**fields, **self._pending.get(key, {})}
+                if self._flush_task is None:
+                    self._flush_task = asyncio.create_task(self._flush_later(FSM_RETRY_DELAY))
+            finally:
+                self._flushing = {}
+
+    async def _write_batch(self, batch: dict[str, dict]):
+        now = datetime.utcnow()
+        cleared, groups = [], {}
+        for key, fields in batch.items():
+            if fields.get("state", "") is None and fields.get("data") == {}:
+                cleared.append(key)  # state.clear(): drop the row instead of storing an empty one
+                continue
+            groups.setdefault(tuple(sorted(fields)), []).append({"key": key, "updated_at": now, **fields})
+
+        async with AsyncSessionLocal() as session:
+            if cleared:
+                await session.execute(delete(FsmRecord).where(FsmRecord.key.in_(cleared)))
+            # One executemany per combination of written fields (state, data or both)
+            for columns, rows in groups.items():
+                stmt = insert(FsmRecord.__table__)
+                stmt = stmt.on_conflict_do_update(
+                    index_elements=["key"],
+                    set_={c: stmt.excluded[c] for c in (*columns, "updated_at")}
+                )
+                await session.execute(stmt, rows)
+            await session.commit()
+
+    def stats(self) -> dict:
+        return {
+            "writes": self.writes,
+            "rows_written": self.rows_written,
+            "flushes": self.flushes,
+            "pending": len(self._pending),
+            "reads": self.reads,
+            "cache_hits": self.cache_hits,
+            "cached_keys": len(self._cache),
+        }
+
+    async def close(self) -> None:
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            self._flush_task = None
+        await self.flush()
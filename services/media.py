@@ -0,0 +1,144 @@
+# services/media.py
+"""Media preflight: make sure a schedule's file_id works before fanning it out."""
+import asyncio
+import hashlib
+import logging
+import time
+from pathlib import Path
+
+from aiogram import Bot
+from aiogram.exceptions import (
+    TelegramAPIError, TelegramBadRequest, TelegramForbiddenError, TelegramNetworkError,
+    TelegramRetryAfter, TelegramServerError,
+)
+from aiogram.types import FSInputFile, Message
+
+from config import MEDIA_CACHE_DIR
+from db.models import Schedule
+from services.rate_limiter import acquire_send_slot, global_limiter
+
+logger = logging.getLogger("scheduler")
+
+# ==============================================================================
+# CONFIGURATION
+# ==============================================================================
+MEDIA_PREFLIGHT_TTL = 3600    # Seconds a validated file_id is trusted without another probe
+PROBE_RETRIES = 3             # Extra probe attempts after a FloodWait or network/server error
+PROBE_RETRY_DELAY = 2.0       # Initial back-off between those attempts (doubles each time)
+
+
+class MediaPreflightError(Exception):
+    """The schedule's media can be neither sent by file_id nor re-uploaded from disk."""
+
+
+_validated = {}  # schedule_id -> (file_id, monotonic time it was last proven to work)
+
+
+def _cache_path(sched_id: int, file_id: str) -> Path:
+    digest = hashlib.sha1(file_id.encode()).hexdigest()[:16]
+    return Path(MEDIA_CACHE_DIR) / f"{sched_id}-{digest}"
+
+
+def _file_id_of(message: Message, media_type: str) -> str:
+    if media_type == "photo":
+        return message.photo[-1].file_id
+    if media_type == "video":
+        return message.video.file_id
+    return message.document.file_id
+
+
+async def _send_probe(bot: Bot, chat_id: int, media_type: str, media) -> Message:
+    """One silent send, retried through FloodWait and transient errors; anything else is raised."""
+    send = {
+        "photo": lambda: bot.send_photo(chat_id, photo=media, disable_notification=True),
+        "video": lambda: bot.send_video(chat_id, video=media, disable_notification=True),
+        "document": lambda: bot.send_document(chat_id, document=media, disable_notification=True),
+    }[media_type]
+    for attempt in range(PROBE_RETRIES + 1):
+        await acquire_send_slot(chat_id)
+        try:
+            return await send()
+        except TelegramRetryAfter as e:
+            if attempt == PROBE_RETRIES:
+                raise
+            logger.warning(f"Media probe: FloodWait {e.retry_after}s")
+            # Pauses every sender on this token; the next acquire_send_slot waits it out
+            global_limiter.on_flood_wait(e.retry_after)
+        except (TelegramNetworkError, TelegramServerError) as e:
+            if attempt == PROBE_RETRIES:
+                raise
+            delay = PROBE_RETRY_DELAY * (2 ** attempt)
+            logger.warning(f"Media probe failed ({e}); retrying in {delay:.0f}s")
+            await asyncio.sleep(delay)
+
+
+async def _store_locally(bot: Bot, sched_id: int, file_id: str):
+    """Keep a copy on disk so a stale file_id can be replaced by re-uploading."""
+    path = _cache_path(sched_id, file_id)
+    if path.exists():
+        return
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".part")
+    try:
+        await bot.download(file_id, destination=tmp)
+        tmp.replace(path)
+    except TelegramAPIError as e:
+        # getFile is capped at 20 MB; larger media simply has no local fallback
+        logger.warning(f"Could not cache media of Schedule #{sched_id} locally: {e}")
+        tmp.unlink(missing_ok=True)
+        return
+    # Drop copies of media this schedule no longer uses
+    for old in path.parent.glob(f"{sched_id}-*"):
+        if old != path:
+            old.unlink(missing_ok=True)
+
+
+async def preflight_media(bot: Bot, session, sched: Schedule) -> str:
+    """
+    Prove the schedule's media is sendable with one silent send to its admin,
+    before any recipient's rate-limit budget is spent on it.
+
+    A rejected file_id is replaced by re-uploading the local copy, and the new
+    file_id is written back to the schedule, so the run (and later runs) fan
+    out with an id this bot is known to accept. A file_id that worked is kept
+    as stored: Telegram may echo a different string for the same file, and
+    rewriting it would reset the MEDIA_PREFLIGHT_TTL cache on every run.
+    Raises MediaPreflightError when neither works.
+    """
+    cached = _validated.get(sched.id)
+    if cached and cached[0] == sched.media_file_id and time.monotonic() - cached[1] < MEDIA_PREFLIGHT_TTL:
+        return sched.media_file_id
+
+    file_id = sched.media_file_id
+    try:
+        try:
+            probe = await _send_probe(bot, sched.admin_id, sched.media_type, sched.media_file_id)
+        except TelegramBadRequest as e:
+            path = _cache_path(sched.id, sched.media_file_id)
+            if not path.exists():
+                raise MediaPreflightError(str(e)) from e
+            logger.warning(f"Media of Schedule #{sched.id} rejected ({e}); re-uploading from {path}")
+            try:
+                probe = await _send_probe(bot, sched.admin_id, sched.media_type, FSInputFile(path))
+            except TelegramBadRequest as e:
+                raise MediaPreflightError(str(e)) from e
+            file_id = _file_id_of(probe, sched.media_type)
+            path.replace(_cache_path(sched.id, file_id))
+    except TelegramForbiddenError:
+        # The admin blocked the bot: no probe target, so send unvalidated as before
+        logger.warning(f"Cannot preflight Schedule #{sched.id}: admin {sched.admin_id} is unreachable")
+        return sched.media_file_id
+
+    try:
+        await bot.delete_message(sched.admin_id, probe.message_id)
+    except TelegramAPIError:
+        pass
+
+    if file_id != sched.media_file_id:
+        logger.info(f"Schedule #{sched.id}: media file_id refreshed")
+        sched.media_file_id = file_id
+        await session.commit()
+
+    await _store_locally(bot, sched.id, file_id)
+    _validated[sched.id] = (file_id, time.monotonic())
+    return file_id
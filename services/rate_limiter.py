@@ -0,0 +1,197 @@
+# services/rate_limiter.py
+"""Rate limiters for outgoing Telegram API calls."""
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+# ==============================================================================
+# CONFIGURATION
+# ==============================================================================
+TELEGRAM_GLOBAL_LIMIT = 30.0  # Messages per second (Global)
+SAFE_GLOBAL_LIMIT = 25.0      # Starting rate for the adaptive limiter
+MAX_ADAPTIVE_RATE = 29.0      # Ceiling the limiter ramps back towards
+MIN_ADAPTIVE_RATE = 5.0       # Never throttle below this
+RATE_INCREASE_STEP = 0.5      # Additive increase per second of clean sends (msg/s)
+RATE_DECREASE_FACTOR = 0.7    # Multiplicative decrease on a flood-wait
+DECREASE_COOLDOWN = 5.0       # Seconds after a cut before another flood-wait may cut again
+PRIVATE_CHAT_INTERVAL = 1.0   # Min seconds between messages to the same private chat
+GROUP_CHAT_INTERVAL = 3.0     # Groups allow ~20 messages per minute
+MAX_TRACKED_CHATS = 10000     # Bound on per-chat limiter memory (LRU)
+
+
+# ==============================================================================
+# RATE LIMITER (Token Bucket)
+# ==============================================================================
+class TokenBucket:
+    """
+    Lock-free token bucket on a release timeline (GCRA).
+
+    Every acquire(n) reserves the next n slots on a virtual timeline spaced
+    1/rate apart and sleeps until its slot. Reservation never awaits, so on a
+    single event loop no lock is needed, callers are served strictly in call
+    order, and a burst above `burst` tokens is impossible.
+    """
+    def __init__(self, rate: float, burst: float = 1.0, clock=time.monotonic):
+        self.rate = rate
+        self.burst = burst
+        self.clock = clock
+        self._tat = clock()  # Theoretical arrival time of the next free slot
+
+    def reserve(self, n: int = 1) -> float:
+        """Reserve n tokens now; return how many seconds the caller must wait."""
+        now = self.clock()
+        interval = 1.0 / self.rate
+        tolerance = (self.burst - 1.0) * interval
+        self._tat = max(self._tat, now) + n * interval
+        return max(0.0, self._tat - interval - tolerance - now)
+
+    def delay_until(self, when: float):
+        """Push the timeline so no new reservation is released before `when`."""
+        self._tat = max(self._tat, when + (self.burst - 1.0) / self.rate)
+
+    async def acquire(self, n: int = 1):
+        """Wait until n tokens are available, then consume them."""
+        wait_time = self.reserve(n)
+        if wait_time > 0:
+            await asyncio.sleep(wait_time)
+
+
+# ==============================================================================
+# ADAPTIVE RATE LIMITER (AIMD)
+# ==============================================================================
+class AdaptiveRateLimiter:
+    """
+    Token bucket whose rate is tuned by Telegram's feedback (AIMD).
+
+    - A flood-wait pauses *every* caller until Telegram's retry_after has passed
+      and cuts the rate by RATE_DECREASE_FACTOR.
+    - Each second's worth of successful sends adds RATE_INCREASE_STEP, up to
+      MAX_ADAPTIVE_RATE.
+    """
+    def __init__(
+        self,
+        rate: float = SAFE_GLOBAL_LIMIT,
+        min_rate: float = MIN_ADAPTIVE_RATE,
+        max_rate: float = MAX_ADAPTIVE_RATE,
+    ):
+        self.bucket = TokenBucket(rate=rate)
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.paused_until = 0.0
+        self.last_decrease = 0.0
+        self._epoch = 0
+        self.flood_waits = 0
+        self._successes = 0
+
+    @property
+    def rate(self) -> float:
+        """Current allowed rate in messages per second."""
+        return self.bucket.rate
+
+    def _set_rate(self, rate: float):
+        self.bucket.rate = max(self.min_rate, min(self.max_rate, rate))
+
+    def scale(self, factor: float):
+        """Shrink (or grow) the whole rate envelope, e.g. when processes share one bot token."""
+        self.min_rate *= factor
+        self.max_rate *= factor
+        self._set_rate(self.rate * factor)
+
+    async def acquire(self, n: int = 1):
+        """Take n tokens, waiting out any global flood pause."""
+        while True:
+            epoch = self._epoch
+            await self.bucket.acquire(n)
+            if epoch == self._epoch:
+                return
+            # A flood-wait happened while we slept: our slot may fall inside the
+            # pause, so take a fresh one from the (pushed back) timeline.
+
+    def on_success(self):
+        """Additive increase: +RATE_INCREASE_STEP per ~1s of successful sends."""
+        if self.rate >= self.max_rate:
+            return
+        self._successes += 1
+        if self._successes >= self.rate:
+            self._successes = 0
+            self._set_rate(self.rate + RATE_INCREASE_STEP)
+
+    def on_flood_wait(self, retry_after: float):
+        """Multiplicative decrease and a global pause for retry_after seconds."""
+        now = time.monotonic()
+        self.flood_waits += 1
+        self._successes = 0
+        self.paused_until = max(self.paused_until, now + retry_after)
+        self.bucket.delay_until(self.paused_until)
+        self._epoch += 1
+
+        # Workers that were already in flight report the same flood-wait; cut once per burst
+        if now - self.last_decrease >= DECREASE_COOLDOWN:
+            self.last_decrease = now
+            old_rate = self.rate
+            self._set_rate(old_rate * RATE_DECREASE_FACTOR)
+            logger.warning(f"Rate limiter: flood-wait {retry_after}s, rate {old_rate:.1f} -> {self.rate:.1f} msg/s")
+
+    def stats(self) -> dict:
+        return {
+            "send_rate": round(self.rate, 2),
+            "flood_waits": self.flood_waits,
+            "paused_for": round(max(0.0, self.paused_until - time.monotonic()), 2),
+        }
+
+
+# ==============================================================================
+# PER-CHAT RATE LIMITER
+# ==============================================================================
+class ChatRateLimiter:
+    """
+    Spaces messages to the same chat (1/s for private chats, 1 per 3s for groups).
+
+    Keeps one "next free slot" timestamp per chat in an LRU bounded by
+    MAX_TRACKED_CHATS; entries whose slot has already passed carry no
+    information and are dropped first.
+    """
+    def __init__(self, max_chats: int = MAX_TRACKED_CHATS):
+        self.max_chats = max_chats
+        self._next_slot = OrderedDict()  # chat_id -> monotonic time of next allowed send
+
+    @staticmethod
+    def interval_for(chat_id: int) -> float:
+        # Group and channel ids are negative
+        return GROUP_CHAT_INTERVAL if chat_id < 0 else PRIVATE_CHAT_INTERVAL
+
+    async def acquire(self, chat_id: int):
+        """Reserve the next slot for chat_id and wait until it arrives."""
+        now = time.monotonic()
+        slot = max(now, self._next_slot.get(chat_id, 0.0))
+        self._next_slot[chat_id] = slot + self.interval_for(chat_id)
+        self._next_slot.move_to_end(chat_id)
+        self._evict(now)
+
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+    def _evict(self, now: float):
+        # Least recently used first: expired entries, then anything over the cap
+        while self._next_slot:
+            chat_id, slot = next(iter(self._next_slot.items()))
+            if slot > now and len(self._next_slot) <= self.max_chats:
+                break
+            del self._next_slot[chat_id]
+
+    def __len__(self) -> int:
+        return len(self._next_slot)
+
+
+# Process-wide limiters shared by the broadcast workers and direct handler sends
+global_limiter = AdaptiveRateLimiter()
+chat_limiter = ChatRateLimiter()
+
+
+async def acquire_send_slot(chat_id: int):
+    """Wait for both the per-chat and the global limit before calling the Bot API."""
+    await chat_limiter.acquire(chat_id)
+    await global_limiter.acquire()
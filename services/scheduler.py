@@ -1,14 +1,25 @@
 import asyncio
+import heapq
+import html
+import json
 import logging
 import time
 from datetime import datetime, timedelta
 from aiogram import Bot
 from aiogram.exceptions import TelegramAPIError, TelegramForbiddenError, TelegramBadRequest, TelegramRetryAfter
 from db.session import AsyncSessionLocal
-from db.models import Schedule, User, ScheduleType, schedule_batch_association
-from sqlalchemy import select, update
+from database import listen
+from config import BOT_TOKEN, INSTANCE_ID, DELIVERY_SHARDS, DELIVERY_BOT_TOKENS
+from db.models import Schedule, User, Batch, ScheduleType, schedule_batch_association, BroadcastOutbox, OutboxStatus
+from sqlalchemy import select, update, delete, or_, func, text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from collections import OrderedDict
 import croniter
-from utils.message_utils import personalize_message
+from services.rate_limiter import AdaptiveRateLimiter, global_limiter, chat_limiter, acquire_send_slot
+from services.media import preflight_media, MediaPreflightError
+from utils.message_utils import (
+    GREETING, compile_template, CompiledMessage, MessageTemplate, MessageFormatError, genders, batch_names
+)
 
 logger = logging.getLogger("scheduler")
 handler = logging.StreamHandler()
@@ -19,126 +30,482 @@ logger.setLevel(logging.INFO)
 # ==============================================================================
 # CONFIGURATION
 # ==============================================================================
-TELEGRAM_GLOBAL_LIMIT = 30.0  # Messages per second (Global)
-SAFE_GLOBAL_LIMIT = 25.0      # Our target safe limit
 WORKER_COUNT = 30             # Number of concurrent workers (enough to saturate the limit)
 MAX_RETRIES = 5               # Robust retry count
 BASE_RETRY_DELAY = 2.0        # Initial retry delay
-MAX_QUEUE_SIZE = 50000        # Safety cap for memory
+CLAIM_BATCH_SIZE = 100        # Outbox rows claimed per DB round trip
+MAX_QUEUE_SIZE = CLAIM_BATCH_SIZE * 2  # In-memory hand-off between claimer and workers
+CLAIM_LEASE = 300             # Seconds a claimed row stays reserved before another worker may retry it
+LEASE_RENEW_INTERVAL = 60     # Rows still held in memory get their lease extended this often
+MAX_FLOOD_WAIT = 120          # Seconds of FloodWait one send sits through before its row is handed back
+OUTBOX_MAX_ATTEMPTS = 3       # Claims per row before it is marked failed (covers crashes mid-send)
+PAYLOAD_CACHE_SIZE = 32       # Rendered schedule payloads kept for in-flight runs
+OUTBOX_POLL_INTERVAL = 5.0    # Idle re-check of the outbox (other processes, expired leases)
+LEDGER_FLUSH_SIZE = 200       # Delivery outcomes written per bulk UPDATE
+LEDGER_FLUSH_INTERVAL = 2.0   # Max seconds an outcome waits in memory before being written
+REPROBE_AFTER = timedelta(days=30)  # Unreachable users are retried once per this interval
+RECONCILE_INTERVAL = 900      # Full DB re-scan of active schedules (safety net for the change feed)
+SCHEDULE_CHANNEL = "schedule_changes"  # NOTIFY channel fed by the schedules trigger
+OUTBOX_CHANNEL = "outbox_ready"        # NOTIFY channel waking sharded delivery workers
+RUN_PROGRESS_INTERVAL = 10    # Seconds between completion checks of a run in flight
+SCHEDULE_LEASE = 600          # Seconds an instance owns a run before another may take it over
+FAILED_RUN_RETRY = 60         # Seconds before a run that crashed is attempted again
+AUDIENCE_CHUNK_SIZE = 1000    # Users read and written to the outbox per keyset page
+OUTBOX_RETENTION = timedelta(days=30)  # Finished outbox rows older than this are deleted
+PRUNE_BATCH_SIZE = 5000       # Outbox rows deleted per statement
 
 # ==============================================================================
-# RATE LIMITER (Token Bucket)
+# BROADCAST PAYLOAD
 # ==============================================================================
-class TokenBucket:
+class BroadcastPayload:
     """
-    A robust token bucket rate limiter for global throughput control.
-    Ensures we never exceed 'rate' actions per second across all workers.
+    Content of one schedule run, compiled once and shared by every queued recipient.
+    Queue records are flat tuples built by job(): (payload, outbox_id, user_id,
+    full_name) when only the name is needed, plus gender_code, batch_code and
+    join_date when the template uses variables. Gender and batch name are
+    interned in utils.message_utils.genders / batch_names.
+
+    `render(full_name, gender_code=0, batch_code=0, join_date=None)` returns
+    the personalized text/caption and its entities. It is bound once per
+    payload to the cheapest path: a message without variables goes straight
+    to CompiledMessage.render, skipping the template and the code lookups.
     """
-    def __init__(self, rate: float):
-        self.rate = rate
-        self.tokens = rate  # Start full
-        self.last_update = time.monotonic()
-        self.lock = asyncio.Lock()
-
-    async def acquire(self):
-        """Wait until a token is available, then consume it."""
-        async with self.lock:
-            now = time.monotonic()
-            elapsed = now - self.last_update
-            # Refill tokens
-            new_tokens = elapsed * self.rate
-            if new_tokens > 0:
-                self.tokens = min(self.rate, self.tokens + new_tokens)
-                self.last_update = now
-
-            if self.tokens >= 1.0:
-                self.tokens -= 1.0
-                return
-            
-            # Calculate wait time
-            wait_time = (1.0 - self.tokens) / self.rate
-            
-            # Reserve the token (consume it effectively in the future)
-            self.tokens = 0.0
-            self.last_update += wait_time # Advance logical time
-            
-        # Wait outside the lock to allow other acquirers to queue effectively
-        if wait_time > 0:
-            await asyncio.sleep(wait_time)
+    __slots__ = ("schedule_id", "text", "media_type", "media_file_id", "template", "render")
+
+    def __init__(self, schedule_id: int, text: str | None, media_type: str | None = None, media_file_id: str | None = None):
+        self.schedule_id = schedule_id
+        self.text = text
+        self.media_type = media_type
+        self.media_file_id = media_file_id
+        self.template = None
+        if text:
+            try:
+                # Not strict: an unknown {word} in a row saved before templates stays literal
+                self.template = compile_template(text, strict=False)
+            except MessageFormatError as e:
+                # Saved before HTML validation existed: deliver the markup literally rather than fail every send
+                logger.warning(f"Schedule #{schedule_id} has invalid HTML ({e}); sending it as plain text")
+                self.template = MessageTemplate(CompiledMessage(text, ()))
+
+        if self.template is None:
+            self.render = self._greeting_only
+        elif not self.template.has_variables:
+            self.render = self.template.message.render
+        else:
+            self.render = self._render_template
+
+    def job(self, outbox_id: int, user_id: int, full_name: str | None, gender: str | None,
+            batch_name: str | None, join_date: datetime | None) -> tuple:
+        """Queue record for one claimed outbox row; the row's strings are not kept."""
+        if self.template is None or not self.template.has_variables:
+            return (self, outbox_id, user_id, full_name)
+        return (self, outbox_id, user_id, full_name, genders.code(gender), batch_names.code(batch_name), join_date)
+
+    @staticmethod
+    def _greeting_only(full_name: str | None) -> tuple[str | None, list]:
+        # Media without caption gets the greeting alone
+        return (f"{GREETING} {full_name}" if full_name else None), []
+
+    def _render_template(self, full_name: str | None, gender_code: int, batch_code: int,
+                         join_date: datetime | None) -> tuple[str | None, list]:
+        return self.template.render(
+            (full_name, genders.value(gender_code), batch_names.value(batch_code), join_date)
+        )
+
+
+# ==============================================================================
+# DELIVERY LEDGER
+# ==============================================================================
+class DeliveryLedger:
+    """
+    Write-behind buffer for delivery outcomes.
+    Workers record (outbox_id, status) in memory; a flusher applies them to the
+    outbox with one bulk UPDATE per LEDGER_FLUSH_SIZE rows or LEDGER_FLUSH_INTERVAL,
+    and updates User.is_reachable for chats that turned out blocked or came back.
+    A PENDING outcome hands the row back unsent (see MAX_FLOOD_WAIT). Written
+    ids are dropped from `leased`, the manager's set of rows held in memory.
+    """
+    def __init__(self, leased: set | None = None):
+        self.buffer = []
+        self.deferred = []
+        self.leased = leased if leased is not None else set()
+        self.blocked_users = set()
+        self.sent_users = set()
+        self.kick = asyncio.Event()
+        self.flusher = None
+        self.total_flushed = 0
+
+    def start(self):
+        if self.flusher is None:
+            self.flusher = asyncio.create_task(self._flush_loop())
+
+    async def stop(self):
+        if self.flusher:
+            self.flusher.cancel()
+            try:
+                await self.flusher  # Its last act is a final flush
+            except asyncio.CancelledError:
+                pass
+            self.flusher = None
+        await self.flush()
+
+    def record(self, outbox_id: int, user_id: int, status: OutboxStatus):
+        if status == OutboxStatus.PENDING:
+            self.deferred.append(outbox_id)
+            return
+        self.buffer.append({"id": outbox_id, "status": status, "delivered_at": datetime.utcnow()})
+        if status == OutboxStatus.BLOCKED:
+            self.blocked_users.add(user_id)
+        elif status == OutboxStatus.SENT:
+            self.sent_users.add(user_id)
+        if len(self.buffer) >= LEDGER_FLUSH_SIZE:
+            self.kick.set()
+
+    async def _flush_loop(self):
+        while True:
+            try:
+                try:
+                    await asyncio.wait_for(self.kick.wait(), timeout=LEDGER_FLUSH_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+                self.kick.clear()
+                await self.flush()
+            except asyncio.CancelledError:
+                # Also reached when asyncio.run cancels everything at exit: outcomes
+                # left in memory would have their users messaged again after the lease
+                try:
+                    await self.flush()
+                except Exception as e:
+                    logger.error(f"Final ledger flush failed, {len(self.buffer)} outcomes lost: {e}")
+                break
+            except Exception as e:
+                logger.error(f"Ledger flush failed: {e}", exc_info=True)
+                await asyncio.sleep(LEDGER_FLUSH_INTERVAL)
+
+    async def flush(self):
+        """Write all buffered outcomes (bulk UPDATE by primary key)."""
+        if not self.buffer and not self.deferred:
+            return
+        batch, self.buffer = self.buffer, []
+        deferred, self.deferred = self.deferred, []
+        blocked, self.blocked_users = self.blocked_users, set()
+        sent, self.sent_users = self.sent_users, set()
+        try:
+            async with AsyncSessionLocal() as session:
+                if batch:
+                    await session.execute(update(BroadcastOutbox), batch)
+                if deferred:
+                    # Not a failed attempt: give the claim back and retry after the flood wait
+                    await session.execute(
+                        update(BroadcastOutbox)
+                        .where(BroadcastOutbox.id.in_(deferred))
+                        .values(
+                            status=OutboxStatus.PENDING,
+                            attempts=BroadcastOutbox.attempts - 1,
+                            next_attempt_at=datetime.utcnow() + timedelta(seconds=MAX_FLOOD_WAIT),
+                        )
+                        .execution_options(synchronize_session=False)
+                    )
+                if blocked:
+                    # Stamped on every failed probe, so the next probe waits REPROBE_AFTER again
+                    await session.execute(
+                        update(User)
+                        .where(User.user_id.in_(blocked))
+                        .values(is_reachable=False, unreachable_since=datetime.utcnow())
+                        .execution_options(synchronize_session=False)
+                    )
+                if sent:
+                    # Only re-probed users actually change
+                    await session.execute(
+                        update(User)
+                        .where(User.user_id.in_(sent), User.is_reachable == False)
+                        .values(is_reachable=True, unreachable_since=None)
+                        .execution_options(synchronize_session=False)
+                    )
+                await session.commit()
+        except Exception:
+            # Keep them for the next attempt; rows stay leased meanwhile
+            self.buffer[:0] = batch
+            self.deferred[:0] = deferred
+            self.blocked_users |= blocked
+            self.sent_users |= sent
+            raise
+        self.leased.difference_update(row["id"] for row in batch)
+        self.leased.difference_update(deferred)
+        self.total_flushed += len(batch)
 
 
 # ==============================================================================
 # BROADCAST MANAGER
 # ==============================================================================
+def shard_token(shard: int) -> str:
+    """Bot token delivery shard `shard` sends with."""
+    return DELIVERY_BOT_TOKENS[shard % len(DELIVERY_BOT_TOKENS)]
+
+
+def token_shares(token: str) -> int:
+    """
+    Processes sending on `token` at once, which split its rate limit: the
+    shards using it and, for BOT_TOKEN, the bot process (handler and admin
+    sends) plus every shard on another token (media goes out through the bot
+    that uploaded it, see delivery_worker.py).
+    """
+    shares = sum(1 for i in range(DELIVERY_SHARDS) if shard_token(i) == token)
+    if token == BOT_TOKEN:
+        shares += 1 + sum(1 for i in range(DELIVERY_SHARDS) if shard_token(i) != BOT_TOKEN)
+    return shares
+
+
 class BroadcastManager:
     """
     Manages the queueing and safe delivery of messages to thousands of users.
-    Uses a worker pool pattern to handle high concurrency while respecting limits.
+    Pending deliveries live in the broadcast_outbox table; a claimer task leases
+    them in batches (FOR UPDATE SKIP LOCKED) and hands them to a worker pool,
+    so a restart resumes where the previous process stopped.
+
+    With `shard` set, only rows with user_id % shards == shard are claimed, so
+    several processes (see delivery_worker.py) can split one broadcast.
+    Media is sent through `media_bot` (paced by `media_limiter`) when given,
+    since a file_id only works for the bot it was uploaded with.
+
+    Rows wait in memory (queue, flood waits, ledger) for an unbounded time, so
+    the ids in `leased` have their lease renewed until the ledger writes them,
+    and a re-claim of a row already held is dropped.
     """
-    def __init__(self, bot: Bot):
+    def __init__(self, bot: Bot, shard: int | None = None, shards: int = 1,
+                 media_bot: Bot | None = None, media_limiter: AdaptiveRateLimiter | None = None):
         self.bot = bot
+        self.media_bot = media_bot or bot
+        self.shard = shard
+        self.shard_filter = [BroadcastOutbox.user_id % shards == shard] if shard is not None else []
         self.queue = asyncio.Queue(maxsize=MAX_QUEUE_SIZE)
-        self.limiter = TokenBucket(rate=SAFE_GLOBAL_LIMIT)
+        self.limiter = global_limiter
+        self.media_limiter = media_limiter or global_limiter
+        self.chat_limiter = chat_limiter
         self.workers = []
+        self.claimer = None
+        self.wakeup = asyncio.Event()
+        self.payloads = OrderedDict()  # (schedule_id, run_at) -> BroadcastPayload
+        self.leased: set[int] = set()  # Claimed outbox ids not yet written back by the ledger
+        self.ledger = DeliveryLedger(self.leased)
+        self.lease_keeper = None
         self.running = False
         self.total_enqueued = 0
         self.total_sent = 0
 
     def start(self):
-        """Start the worker pool."""
+        """Start the claimer and the worker pool."""
         if self.running:
             return
         self.running = True
+        self.ledger.start()
+        self.claimer = asyncio.create_task(self._claimer())
+        self.lease_keeper = asyncio.create_task(self._renew_leases())
         self.workers = [asyncio.create_task(self._worker(i)) for i in range(WORKER_COUNT)]
-        logger.info(f"BroadcastManager STARTED with {WORKER_COUNT} workers.")
+        shard = f" (shard {self.shard})" if self.shard is not None else ""
+        logger.info(f"BroadcastManager STARTED with {WORKER_COUNT} workers{shard}.")
 
     async def stop(self):
-        """Gracefully stop workers (wait for queue to empty? No, hard stop for now)."""
+        """Stop claiming and cancel workers. Unfinished rows are re-claimed once their lease expires."""
+        if not self.running:
+            return
         self.running = False
-        # In a real shutdown, we might wait for join(), but for bot reload we just cancel
+        if self.claimer:
+            self.claimer.cancel()
+        if self.lease_keeper:
+            self.lease_keeper.cancel()
         for w in self.workers:
             w.cancel()
+        await self.ledger.stop()
         logger.info("BroadcastManager STOPPED.")
 
-    async def enqueue_job(self, user_id: int, message: str, sched_id: int, full_name: str = None, media_type: str = None, media_file_id: str = None):
-        """Add a job to the queue. Non-blocking unless queue is full."""
-        try:
-            self.queue.put_nowait((user_id, message, sched_id, full_name, media_type, media_file_id))
-            self.total_enqueued += 1
-            if self.total_enqueued % 1000 == 0:
-                logger.info(f"Queue Stats: size={self.queue.qsize()}, total_enqueued={self.total_enqueued}")
-        except asyncio.QueueFull:
-            logger.warning("Broadcast queue FULL! Waiting to enqueue...")
-            await self.queue.put((user_id, message, sched_id, full_name, media_type, media_file_id))
+    def stats(self) -> dict:
+        """Snapshot of delivery counters and limiter state for the /metrics endpoint."""
+        return {
+            "shard": self.shard,
+            "queue_size": self.queue.qsize(),
+            "total_enqueued": self.total_enqueued,
+            "total_sent": self.total_sent,
+            "ledger_buffered": len(self.ledger.buffer),
+            "leased": len(self.leased),
+            **self.limiter.stats(),
+            "tracked_chats": len(self.chat_limiter),
+        }
+
+    def notify(self):
+        """Wake the claimer after new outbox rows were committed."""
+        self.wakeup.set()
+
+    async def _renew_leases(self):
+        """Keep extending the lease of rows still held in memory, so they are never claimed twice."""
+        while self.running:
+            try:
+                await asyncio.sleep(LEASE_RENEW_INTERVAL)
+                ids = list(self.leased)
+                if not ids:
+                    continue
+                async with AsyncSessionLocal() as session:
+                    for i in range(0, len(ids), CLAIM_BATCH_SIZE * 10):
+                        await session.execute(
+                            update(BroadcastOutbox)
+                            .where(
+                                BroadcastOutbox.id.in_(ids[i:i + CLAIM_BATCH_SIZE * 10]),
+                                BroadcastOutbox.status == OutboxStatus.SENDING,
+                            )
+                            .values(next_attempt_at=datetime.utcnow() + timedelta(seconds=CLAIM_LEASE))
+                            .execution_options(synchronize_session=False)
+                        )
+                    await session.commit()
+            except asyncio.CancelledError:
+                break
+            except Exception as e:
+                logger.error(f"Lease renewal failed: {e}", exc_info=True)
+
+    async def _claimer(self):
+        """Lease due outbox rows in batches and feed them to the workers."""
+        while self.running:
+            try:
+                self.wakeup.clear()
+                jobs = await self._claim_batch()
+
+                if not jobs:
+                    await self._fail_exhausted()
+                    try:
+                        await asyncio.wait_for(self.wakeup.wait(), timeout=OUTBOX_POLL_INTERVAL)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+
+                for job in jobs:
+                    await self.queue.put(job)
+                    self.total_enqueued += 1
+                    if self.total_enqueued % 1000 == 0:
+                        logger.info(f"Queue Stats: size={self.queue.qsize()}, total_enqueued={self.total_enqueued}")
+
+            except asyncio.CancelledError:
+                break
+            except Exception as e:
+                logger.error(f"Outbox claimer crash: {e}", exc_info=True)
+                await asyncio.sleep(OUTBOX_POLL_INTERVAL)
+
+    async def _claim_batch(self) -> list[tuple]:
+        """Atomically lease up to CLAIM_BATCH_SIZE due rows and resolve their message content."""
+        now = datetime.utcnow()
+        due = (
+            select(BroadcastOutbox.id)
+            .where(
+                BroadcastOutbox.status.in_([OutboxStatus.PENDING, OutboxStatus.SENDING]),
+                BroadcastOutbox.next_attempt_at <= now,
+                BroadcastOutbox.attempts < OUTBOX_MAX_ATTEMPTS,
+                *self.shard_filter,
+            )
+            .order_by(BroadcastOutbox.id)
+            .limit(CLAIM_BATCH_SIZE)
+            .with_for_update(skip_locked=True)
+        )
+        stmt = (
+            update(BroadcastOutbox)
+            .where(BroadcastOutbox.id.in_(due))
+            .values(
+                status=OutboxStatus.SENDING,
+                attempts=BroadcastOutbox.attempts + 1,
+                next_attempt_at=now + timedelta(seconds=CLAIM_LEASE),
+            )
+            .returning(
+                BroadcastOutbox.id,
+                BroadcastOutbox.schedule_id,
+                BroadcastOutbox.run_at,
+                BroadcastOutbox.user_id,
+                BroadcastOutbox.full_name,
+                BroadcastOutbox.gender,
+                BroadcastOutbox.batch_name,
+                BroadcastOutbox.join_date,
+            )
+            .execution_options(synchronize_session=False)
+        )
+
+        async with AsyncSessionLocal() as session:
+            rows = (await session.execute(stmt)).all()
+            await session.commit()
+
+            if not rows:
+                return []
+
+            missing = {(row.schedule_id, row.run_at) for row in rows} - self.payloads.keys()
+            if missing:
+                await self._load_payloads(session, missing)
+
+        jobs = []
+        for outbox_id, sched_id, run_at, user_id, full_name, gender, batch_name, join_date in rows:
+            if outbox_id in self.leased:
+                continue  # Lease ran out while still queued here (renewal failed); already ours
+            payload = self.payloads.get((sched_id, run_at))
+            if payload is None:
+                continue  # Schedule deleted after claim; its rows cascade away
+            self.payloads.move_to_end((sched_id, run_at))
+            self.leased.add(outbox_id)
+            jobs.append(payload.job(outbox_id, user_id, full_name, gender, batch_name, join_date))
+        return jobs
+
+    async def _load_payloads(self, session, keys: set[tuple]):
+        """Render the payload of each (schedule, run) once and keep it in a small LRU."""
+        result = await session.execute(
+            select(
+                Schedule.id, Schedule.message, Schedule.caption,
+                Schedule.media_type, Schedule.media_file_id
+            ).where(Schedule.id.in_({sched_id for sched_id, _ in keys}))
+        )
+        content = {r.id: r for r in result}
+
+        for sched_id, run_at in keys:
+            sched = content.get(sched_id)
+            if sched is None:
+                continue
+            text = sched.caption if sched.media_type else sched.message
+            self.payloads[(sched_id, run_at)] = BroadcastPayload(
+                sched_id, text, sched.media_type, sched.media_file_id
+            )
+
+        while len(self.payloads) > PAYLOAD_CACHE_SIZE:
+            self.payloads.popitem(last=False)
+
+    async def _fail_exhausted(self):
+        """Give up on rows whose lease expired too many times (e.g. repeated crashes mid-send)."""
+        async with AsyncSessionLocal() as session:
+            await session.execute(
+                update(BroadcastOutbox)
+                .where(
+                    BroadcastOutbox.status == OutboxStatus.SENDING,
+                    BroadcastOutbox.next_attempt_at <= datetime.utcnow(),
+                    BroadcastOutbox.attempts >= OUTBOX_MAX_ATTEMPTS,
+                    *self.shard_filter,
+                )
+                .values(status=OutboxStatus.FAILED)
+                .execution_options(synchronize_session=False)
+            )
+            await session.commit()
 
     async def _worker(self, worker_id: int):
         """Worker loop processing messages from queue."""
         while self.running:
+            outbox_id = None
             try:
-                user_id, text, sched_id, full_name, media_type, media_file_id = await self.queue.get()
-                
-                # Debug logging
-                logger.info(f"Worker {worker_id}: user_id={user_id}, full_name={full_name}, media_type={media_type}")
-                
-                # Personalize caption/message if full_name provided
-                if full_name and text:
-                    text = personalize_message(text, full_name)
-                    logger.info(f"Worker {worker_id}: Personalized message for {user_id}")
-                elif full_name and not text:
-                    # Media without caption - create greeting
-                    text = f"ሰላም {full_name}"
-                
-                # Enforce Rate Limit
-                await self.limiter.acquire()
+                payload, outbox_id, user_id, *recipient = await self.queue.get()
+                logger.debug("Worker %s: schedule=%s user_id=%s", worker_id, payload.schedule_id, user_id)
+
+                # Personalized caption/message, formatting as pre-parsed entities
+                text, entities = payload.render(*recipient)
                 
                 # Send based on media type (text is already personalized)
-                if media_type:
-                    success = await self._send_media(user_id, media_type, media_file_id, text)
+                if payload.media_type:
+                    status = await self._send_media(user_id, payload.media_type, payload.media_file_id, text, entities)
                 else:
-                    success = await self._send_safe(user_id, text)
+                    status = await self._send_safe(user_id, text, entities)
                 
-                if success:
+                if status == OutboxStatus.SENT:
                     self.total_sent += 1
+
+                self.ledger.record(outbox_id, user_id, status)
                 
                 self.queue.task_done()
                 
@@ -146,39 +513,47 @@ class BroadcastManager:
                 break
             except Exception as e:
                 logger.error(f"Worker {worker_id} crash: {e}", exc_info=True)
+                self.leased.discard(outbox_id)  # Let its lease run out so the row is retried
                 await asyncio.sleep(1) # Prevent tight loop crash
 
-    async def _send_safe(self, user_id: int, text: str) -> bool:
-        """Robust send with retry logic."""
+    async def _send_safe(self, user_id: int, text: str, entities: list = None) -> OutboxStatus:
+        """Robust send with retry logic. Returns the delivery outcome (PENDING: hand the row back)."""
+        flood_waited = 0
         for attempt in range(MAX_RETRIES + 1):
+            # Every attempt is an API call: wait for the chat's slot, then a global token
+            await self.chat_limiter.acquire(user_id)
+            await self.limiter.acquire()
             try:
                 await self.bot.send_message(
                     chat_id=user_id,
                     text=text,
-                    parse_mode="HTML",
+                    entities=entities,
+                    parse_mode=None,  # Entities replace server-side HTML parsing
                     disable_web_page_preview=True
                 )
-                return True
+                self.limiter.on_success()
+                return OutboxStatus.SENT
 
             except TelegramRetryAfter as e:
-                # We hit a limit despite our bucket. Respect Telegram's wish.
-                wait_s = e.retry_after
-                logger.warning(f"FloodWait: Sleeping {wait_s}s for user {user_id}")
-                await asyncio.sleep(wait_s)
-                # Retry immediately after waiting
+                # We hit a limit despite our bucket. Pause every worker and slow down.
+                logger.warning(f"FloodWait: {e.retry_after}s (user {user_id})")
+                self.limiter.on_flood_wait(e.retry_after)
+                flood_waited += e.retry_after
+                if flood_waited > MAX_FLOOD_WAIT:
+                    return OutboxStatus.PENDING
                 continue
 
             except TelegramForbiddenError:
                 # Blocked
-                return False
+                return OutboxStatus.BLOCKED
 
             except TelegramBadRequest as e:
                 # Check for "chat not found"
                 if "chat not found" in str(e).lower() or "deactivated" in str(e).lower():
-                    return False
+                    return OutboxStatus.BLOCKED
                 logger.warning(f"BadRequest to {user_id}: {e}")
                 # Don't retry bad requests typically
-                return False
+                return OutboxStatus.FAILED
 
             except TelegramAPIError as e:
                 logger.warning(f"API Error to {user_id} (Attempt {attempt+1}/{MAX_RETRIES}): {e}")
@@ -192,49 +567,58 @@ class BroadcastManager:
                 await asyncio.sleep(sleep_time)
 
         logger.error(f"Failed to send to {user_id} after {MAX_RETRIES} attempts.")
-        return False
+        return OutboxStatus.FAILED
 
-    async def _send_media(self, user_id: int, media_type: str, file_id: str, caption: str = None) -> bool:
+    async def _send_media(self, user_id: int, media_type: str, file_id: str, caption: str = None, entities: list = None) -> OutboxStatus:
         """Send media (photo/video/document) with caption (already personalized)."""
+        flood_waited = 0
         for attempt in range(MAX_RETRIES + 1):
+            await self.chat_limiter.acquire(user_id)
+            await self.media_limiter.acquire()
             try:
                 if media_type == "photo":
-                    await self.bot.send_photo(
+                    await self.media_bot.send_photo(
                         chat_id=user_id,
                         photo=file_id,
                         caption=caption,
-                        parse_mode="HTML"
+                        caption_entities=entities,
+                        parse_mode=None
                     )
                 elif media_type == "video":
-                    await self.bot.send_video(
+                    await self.media_bot.send_video(
                         chat_id=user_id,
                         video=file_id,
                         caption=caption,
-                        parse_mode="HTML"
+                        caption_entities=entities,
+                        parse_mode=None
                     )
                 elif media_type == "document":
-                    await self.bot.send_document(
+                    await self.media_bot.send_document(
                         chat_id=user_id,
                         document=file_id,
                         caption=caption,
-                        parse_mode="HTML"
+                        caption_entities=entities,
+                        parse_mode=None
                     )
-                return True
+                self.media_limiter.on_success()
+                return OutboxStatus.SENT
 
             except TelegramRetryAfter as e:
-                wait_s = e.retry_after
-                logger.warning(f"FloodWait: Sleeping {wait_s}s for user {user_id}")
-                await asyncio.sleep(wait_s)
+                logger.warning(f"FloodWait: {e.retry_after}s (user {user_id})")
+                self.media_limiter.on_flood_wait(e.retry_after)
+                flood_waited += e.retry_after
+                if flood_waited > MAX_FLOOD_WAIT:
+                    return OutboxStatus.PENDING
                 continue
 
             except TelegramForbiddenError:
-                return False
+                return OutboxStatus.BLOCKED
 
             except TelegramBadRequest as e:
                 if "chat not found" in str(e).lower() or "deactivated" in str(e).lower():
-                    return False
+                    return OutboxStatus.BLOCKED
                 logger.warning(f"BadRequest to {user_id}: {e}")
-                return False
+                return OutboxStatus.FAILED
 
             except TelegramAPIError as e:
                 logger.warning(f"API Error to {user_id} (Attempt {attempt+1}/{MAX_RETRIES}): {e}")
@@ -247,14 +631,238 @@ class BroadcastManager:
                 await asyncio.sleep(sleep_time)
 
         logger.error(f"Failed to send media to {user_id} after {MAX_RETRIES} attempts.")
-        return False
+        return OutboxStatus.FAILED
+
+
+# ==============================================================================
+# SCHEDULE TIMER
+# ==============================================================================
+class ScheduleTimer:
+    """
+    Min-heap of (next_run, schedule_id) so the scheduler sleeps exactly until
+    the next due schedule. Updates push a new entry and record the valid time
+    in `due_at`; superseded heap entries are skipped lazily when they surface.
+    """
+    def __init__(self):
+        self.heap = []
+        self.due_at = {}  # schedule_id -> next_run currently in force
+        self.changed = asyncio.Event()
+
+    def set(self, schedule_id: int, next_run: datetime | None, is_active: bool = True):
+        """Insert, move or (when inactive / unscheduled) remove a schedule."""
+        if not is_active or next_run is None:
+            self.due_at.pop(schedule_id, None)
+        else:
+            self.due_at[schedule_id] = next_run
+            heapq.heappush(self.heap, (next_run, schedule_id))
+            if len(self.heap) > 2 * len(self.due_at) + 64:
+                self._compact()
+        self.changed.set()
+
+    def replace_all(self, items):
+        """Rebuild from an authoritative list of (schedule_id, next_run)."""
+        self.due_at = dict(items)
+        self._compact()
+        self.changed.set()
+
+    def _compact(self):
+        self.heap = [(next_run, sched_id) for sched_id, next_run in self.due_at.items()]
+        heapq.heapify(self.heap)
+
+    def _drop_stale(self):
+        while self.heap:
+            next_run, sched_id = self.heap[0]
+            if self.due_at.get(sched_id) == next_run:
+                return
+            heapq.heappop(self.heap)
+
+    def pop_due(self, now: datetime) -> list[int]:
+        """Remove and return every schedule whose next_run has arrived."""
+        due = []
+        self._drop_stale()
+        while self.heap and self.heap[0][0] <= now:
+            _, sched_id = heapq.heappop(self.heap)
+            del self.due_at[sched_id]
+            due.append(sched_id)
+            self._drop_stale()
+        return due
+
+    def next_deadline(self) -> datetime | None:
+        self._drop_stale()
+        return self.heap[0][0] if self.heap else None
 
 
 # ==============================================================================
 # SCHEDULER LOGIC
 # ==============================================================================
-running_schedules = set()
+running_schedules = set()  # Runs in flight in this process (cross-instance exclusion is the DB lease)
 broadcast_manager: BroadcastManager = None
+schedule_timer = ScheduleTimer()
+active_runs = {}  # (schedule_id, run_at) -> outcome counts, for runs being tracked
+
+
+def notify_schedule_changed(schedule_id: int, next_run: datetime | None, is_active: bool = True):
+    """Called by handlers after committing a create/edit/toggle/delete of a schedule."""
+    schedule_timer.set(schedule_id, next_run, is_active)
+
+
+class IdBitmap:
+    """
+    Set of non-negative ints stored one bit per value. users.id is a dense
+    serial, so a whole run's audience costs ~max_id / 8 bytes (125 KB per
+    million users) instead of ~60 bytes per entry in a set.
+    """
+    __slots__ = ("bits", "count")
+
+    def __init__(self):
+        self.bits = bytearray()
+        self.count = 0
+
+    def add(self, value: int) -> bool:
+        """Mark value as seen; False if it already was."""
+        byte, mask = value >> 3, 1 << (value & 7)
+        if byte >= len(self.bits):
+            # Grow geometrically so a run costs O(log n) reallocations
+            self.bits.extend(bytes(max(byte + 1, 2 * len(self.bits)) - len(self.bits)))
+        if self.bits[byte] & mask:
+            return False
+        self.bits[byte] |= mask
+        self.count += 1
+        return True
+
+    def __len__(self) -> int:
+        return self.count
+
+
+def audience_page_query(batch_id: int, after_id: int, reprobe_before: datetime):
+    """
+    One keyset page of a batch's reachable users. Served by an index-only range
+    scan on ix_users_batch_audience (batch_id, id) INCLUDE (...).
+    """
+    # Template variables are snapshotted with the row, like full_name
+    return select(
+        User.id, User.user_id, User.full_name, User.gender, User.join_date
+    ).where(
+        User.batch_id == batch_id,
+        User.id > after_id,
+        # Skip chats known to be blocked/deleted, except for a periodic re-probe
+        or_(User.is_reachable == True, User.unreachable_since < reprobe_before)
+    ).order_by(User.id).limit(AUDIENCE_CHUNK_SIZE)
+
+
+def active_schedules_query():
+    """Every schedule the timer must track; served by the partial ix_schedules_active_next_run."""
+    return select(Schedule.id, Schedule.next_run).where(
+        Schedule.is_active == True,
+        Schedule.next_run.isnot(None)
+    )
+
+
+async def enqueue_audience(session, sched_id: int, run_at: datetime) -> int:
+    """
+    Copy a schedule's audience into the outbox, batch by batch, using keyset
+    pagination on (batch_id, User.id). Each chunk is committed and the workers
+    woken immediately, so delivery starts after the first page and memory stays
+    bounded by AUDIENCE_CHUNK_SIZE.
+
+    A user reached through several batches is written once: the run keeps an
+    IdBitmap of users already streamed. Returns the number of distinct recipients.
+    """
+    seen = IdBitmap()
+    written = 0
+    reprobe_before = datetime.utcnow() - REPROBE_AFTER
+    batches = (await session.execute(
+        select(Batch.id, Batch.name).join(
+            schedule_batch_association,
+            Batch.id == schedule_batch_association.c.batch_id
+        ).where(
+            schedule_batch_association.c.schedule_id == sched_id
+        ).order_by(Batch.id)
+    )).all()
+
+    for batch_id, batch_name in batches:
+        written += await _enqueue_batch(session, sched_id, run_at, batch_id, batch_name, reprobe_before, seen)
+
+    if written < len(seen):
+        logger.info(f"Schedule #{sched_id}: {len(seen) - written} recipients were already in the outbox (resumed run)")
+    return len(seen)
+
+
+async def _enqueue_batch(session, sched_id: int, run_at: datetime, batch_id: int, batch_name: str,
+                         reprobe_before: datetime, seen: IdBitmap) -> int:
+    # Paging one batch at a time keeps every page a single contiguous index range;
+    # a join over several batches ordered by User.id cannot stop early.
+    written = 0
+    last_id = 0
+    while True:
+        page = (await session.execute(audience_page_query(batch_id, last_id, reprobe_before))).all()
+        if not page:
+            break
+        last_id = page[-1].id
+        chunk = [row for row in page if seen.add(row.id)]
+        if chunk:
+            # Keyed by (schedule, run, user): re-running an interrupted run is a no-op,
+            # and RETURNING counts only the rows this pass actually wrote
+            now = datetime.utcnow()
+            result = await session.execute(
+                pg_insert(BroadcastOutbox).on_conflict_do_nothing(
+                    constraint="uq_broadcast_outbox_run_user"
+                ).returning(BroadcastOutbox.id),
+                [
+                    {
+                        "schedule_id": sched_id,
+                        "run_at": run_at,
+                        "user_id": user_id,
+                        "full_name": full_name,
+                        "gender": gender,
+                        "batch_name": batch_name,
+                        "join_date": join_date,
+                        "status": OutboxStatus.PENDING,
+                        "attempts": 0,
+                        "next_attempt_at": now,
+                    }
+                    for _, user_id, full_name, gender, join_date in chunk
+                ]
+            )
+            written += len(result.all())
+            if broadcast_manager is None:
+                # Delivery runs in shard processes; delivered to listeners on commit
+                await session.execute(text(f"NOTIFY {OUTBOX_CHANNEL}"))
+            await session.commit()
+            if broadcast_manager is not None:
+                broadcast_manager.notify()
+
+        if len(page) < AUDIENCE_CHUNK_SIZE:
+            break
+
+    return written
+
+
+async def claim_schedule_run(session, sched_id: int) -> bool:
+    """
+    Atomically take the lease on a due schedule. Only one instance can hold it;
+    a lease left behind by a crashed instance is taken over once it expires.
+    """
+    now = datetime.utcnow()
+    result = await session.execute(
+        update(Schedule).where(
+            Schedule.id == sched_id,
+            Schedule.is_active == True,
+            Schedule.next_run <= now,
+            or_(
+                Schedule.lease_expires_at.is_(None),
+                Schedule.lease_expires_at < now,
+                Schedule.lease_owner == INSTANCE_ID
+            )
+        ).values(
+            lease_owner=INSTANCE_ID,
+            lease_expires_at=now + timedelta(seconds=SCHEDULE_LEASE)
+        ).returning(Schedule.id)
+    )
+    claimed = result.scalar_one_or_none() is not None
+    await session.commit()
+    return claimed
+
 
 async def execute_schedule_logic(bot: Bot, sched_id: int):
     """Fetches users and feeds the BroadcastManager."""
@@ -262,42 +870,37 @@ async def execute_schedule_logic(bot: Bot, sched_id: int):
     
     try:
         async with AsyncSessionLocal() as session:
-            # 1. Fetch Schedule
-            sched = await session.get(Schedule, sched_id)
-            if not sched or not sched.is_active:
-                logger.warning("Schedule invalid or inactive.")
+            # 1. Claim and fetch Schedule
+            if not await claim_schedule_run(session, sched_id):
+                sched = await session.get(Schedule, sched_id)
+                if sched and sched.is_active and sched.next_run:
+                    # Rescheduled, or another instance holds the run: look again when
+                    # it is due or when that instance's lease could have expired
+                    retry_at = max(sched.next_run, sched.lease_expires_at or sched.next_run)
+                    schedule_timer.set(sched.id, retry_at)
+                else:
+                    logger.warning("Schedule invalid or inactive.")
                 return
 
-            # 2. Fetch Users with full_name for personalization
-            stmt = select(User.user_id, User.full_name).join(
-                schedule_batch_association, 
-                User.batch_id == schedule_batch_association.c.batch_id
-            ).where(
-                schedule_batch_association.c.schedule_id == sched.id
-            )
-            
-            result = await session.execute(stmt)
-            users = result.fetchall()
+            sched = await session.get(Schedule, sched_id)
 
-            if not users:
+            # 2. Media preflight: a dead file_id would fail (and bill) every recipient
+            if sched.media_type:
+                try:
+                    await preflight_media(bot, session, sched)
+                except MediaPreflightError as e:
+                    await pause_for_bad_media(bot, session, sched, str(e))
+                    return
+
+            # 3. Stream the audience into the outbox (committed chunk by chunk)
+            total = await enqueue_audience(session, sched.id, sched.next_run)
+            if not total:
                 logger.info(f"No users found for Schedule #{sched.id}")
             else:
-                logger.info(f"Enqueueing {len(users)} messages for Schedule #{sched.id}")
-                # Determine what to send
-                message_content = sched.caption if sched.media_type else sched.message
-                
-                for user_id, full_name in users:
-                    logger.info(f"Enqueuing for user_id={user_id}, full_name={full_name}")
-                    await broadcast_manager.enqueue_job(
-                        user_id, 
-                        message_content, 
-                        sched.id, 
-                        full_name,
-                        sched.media_type,
-                        sched.media_file_id
-                    )
+                logger.info(f"Queued {total} recipients for Schedule #{sched.id}")
+                asyncio.create_task(track_run(sched.id, sched.next_run))
 
-            # 3. Calculate Next Run
+            # 4. Calculate Next Run
             now = datetime.utcnow()
             next_run = None
             
@@ -319,55 +922,221 @@ async def execute_schedule_logic(bot: Bot, sched_id: int):
                 except ValueError:
                     pass
 
-            # 4. Update DB
-            values = {}
+            # 5. Update DB
+            values = {"lease_owner": None, "lease_expires_at": None}
             if next_run:
                 values["next_run"] = next_run
             else:
                 values["is_active"] = False
             
-            await session.execute(update(Schedule).where(Schedule.id == sched.id).values(**values))
+            # Advance only after the whole audience is in the outbox; if we crash
+            # before this, the run is picked up again and existing rows are skipped.
+            # Fenced by the lease: if it expired and another instance took over,
+            # that instance advances the schedule (its outbox inserts were no-ops)
+            result = await session.execute(
+                update(Schedule).where(
+                    Schedule.id == sched.id,
+                    Schedule.lease_owner == INSTANCE_ID
+                ).values(**values)
+            )
             await session.commit()
+            if not result.rowcount:
+                logger.warning(f"Lost the lease on Schedule #{sched.id}; leaving it to the new owner")
+                return
+            schedule_timer.set(sched.id, next_run)
             
             logger.info(f"Schedule #{sched.id} processed. Next run: {next_run}")
 
     except Exception as e:
         logger.error(f"Example execution failed: {e}", exc_info=True)
+        # Still due in the DB: try again shortly (the outbox skips rows already written)
+        schedule_timer.set(sched_id, datetime.utcnow() + timedelta(seconds=FAILED_RUN_RETRY))
     finally:
         running_schedules.discard(sched_id)
 
 
+async def pause_for_bad_media(bot: Bot, session, sched: Schedule, reason: str):
+    """Deactivate a schedule whose media cannot be sent and tell its admin why."""
+    logger.error(f"Schedule #{sched.id} paused: media preflight failed ({reason})")
+    await session.execute(
+        update(Schedule).where(
+            Schedule.id == sched.id,
+            Schedule.lease_owner == INSTANCE_ID
+        ).values(is_active=False, lease_owner=None, lease_expires_at=None)
+    )
+    await session.commit()
+    schedule_timer.set(sched.id, None, is_active=False)
+
+    try:
+        await acquire_send_slot(sched.admin_id)
+        await bot.send_message(
+            sched.admin_id,
+            f"⚠️ <b>Schedule #{sched.id} was paused</b>\n\n"
+            f"Its media can no longer be sent: <code>{html.escape(reason)}</code>\n"
+            f"Re-create the schedule with a fresh upload.",
+            parse_mode="HTML"
+        )
+    except TelegramAPIError as e:
+        logger.warning(f"Could not notify admin {sched.admin_id}: {e}")
+
+
+async def track_run(sched_id: int, run_at: datetime):
+    """
+    Coordinator side of a run: poll the outbox until every recipient has an
+    outcome (whichever process or shard delivered it) and log the summary.
+    """
+    key = (sched_id, run_at)
+    started = time.monotonic()
+    stmt = select(
+        func.count().filter(BroadcastOutbox.status.in_([OutboxStatus.PENDING, OutboxStatus.SENDING])),
+        func.count().filter(BroadcastOutbox.status == OutboxStatus.SENT),
+        func.count().filter(BroadcastOutbox.status == OutboxStatus.BLOCKED),
+        func.count().filter(BroadcastOutbox.status == OutboxStatus.FAILED),
+    ).where(BroadcastOutbox.schedule_id == sched_id, BroadcastOutbox.run_at == run_at)
+
+    try:
+        while True:
+            await asyncio.sleep(RUN_PROGRESS_INTERVAL)
+            async with AsyncSessionLocal() as session:
+                pending, sent, blocked, failed = (await session.execute(stmt)).one()
+            active_runs[key] = {"pending": pending, "sent": sent, "blocked": blocked, "failed": failed}
+            if not pending:
+                break
+        elapsed = time.monotonic() - started
+        logger.info(
+            f"Run of Schedule #{sched_id} at {run_at} finished in {elapsed:.0f}s: "
+            f"sent={sent} blocked={blocked} failed={failed}"
+        )
+    except Exception as e:
+        logger.error(f"Progress tracking for Schedule #{sched_id} failed: {e}")
+    finally:
+        active_runs.pop(key, None)
+
+
+def run_progress() -> list[dict]:
+    """Progress of the runs this process is coordinating, for the /metrics endpoint."""
+    return [
+        {"schedule_id": sched_id, "run_at": run_at.isoformat(), **counts}
+        for (sched_id, run_at), counts in active_runs.items()
+    ]
+
+
+async def prune_outbox():
+    """
+    Delete finished outbox rows older than OUTBOX_RETENTION, oldest first in
+    PRUNE_BATCH_SIZE chunks (ids grow with created_at, so the primary key
+    finds them without a scan). Rows still pending are never touched.
+    """
+    cutoff = datetime.utcnow() - OUTBOX_RETENTION
+    total = 0
+    while True:
+        doomed = (
+            select(BroadcastOutbox.id)
+            .where(
+                BroadcastOutbox.status.in_([OutboxStatus.SENT, OutboxStatus.BLOCKED, OutboxStatus.FAILED]),
+                BroadcastOutbox.created_at < cutoff,
+            )
+            .order_by(BroadcastOutbox.id)
+            .limit(PRUNE_BATCH_SIZE)
+            .with_for_update(skip_locked=True)
+        )
+        async with AsyncSessionLocal() as session:
+            result = await session.execute(
+                delete(BroadcastOutbox)
+                .where(BroadcastOutbox.id.in_(doomed))
+                .execution_options(synchronize_session=False)
+            )
+            await session.commit()
+        total += result.rowcount
+        if result.rowcount < PRUNE_BATCH_SIZE:
+            break
+    if total:
+        logger.info(f"Pruned {total} outbox rows older than {OUTBOX_RETENTION.days} days")
+
+
+async def _prune_outbox_safely():
+    try:
+        await prune_outbox()
+    except Exception as e:
+        logger.error(f"Outbox pruning failed: {e}")
+
+
+async def reconcile_schedules():
+    """Reload every active schedule's next_run from the DB into the timer heap."""
+    async with AsyncSessionLocal() as session:
+        result = await session.execute(active_schedules_query())
+        schedule_timer.replace_all(result.all())
+
+
+# ==============================================================================
+# SCHEDULE CHANGE FEED (LISTEN/NOTIFY)
+# ==============================================================================
+def _on_schedule_notification(connection, pid, channel, payload):
+    """asyncpg listener callback: apply one schedules row change to the timer."""
+    try:
+        event = json.loads(payload)
+        next_run = datetime.fromisoformat(event["next_run"]) if event["next_run"] else None
+        is_active = event["op"] != "DELETE" and bool(event["is_active"])
+        schedule_timer.set(event["id"], next_run, is_active)
+    except (ValueError, KeyError, TypeError) as e:
+        logger.error(f"Bad schedule notification {payload!r}: {e}")
+
+
+async def schedule_change_listener():
+    """
+    Push every schedule insert/update/delete (from any process) into the timer
+    heap. Each (re)connect is followed by a full reconcile.
+    """
+    await listen(SCHEDULE_CHANNEL, _on_schedule_notification, on_connect=reconcile_schedules)
+
+
 async def scheduler_loop(bot: Bot):
-    """Main background loop."""
+    """Main background loop: sleep until the earliest next_run, then dispatch."""
     global broadcast_manager
-    if broadcast_manager is None:
+    if DELIVERY_SHARDS > 1:
+        # Handler and admin sends still use BOT_TOKEN: this process is one of its shares
+        global_limiter.scale(1 / token_shares(BOT_TOKEN))
+        logger.info(
+            f"Delivery delegated to {DELIVERY_SHARDS} shard workers (delivery_worker.py), "
+            f"bot process at {global_limiter.rate:.1f} msg/s"
+        )
+    elif broadcast_manager is None:
         broadcast_manager = BroadcastManager(bot)
         broadcast_manager.start()
 
-    logger.info("Scheduler loop STARTED (Robust Mode)")
+    asyncio.create_task(schedule_change_listener())
+
+    logger.info("Scheduler loop STARTED (Timer Heap)")
 
+    last_reconcile = None
     while True:
         try:
-            now = datetime.utcnow()
-            async with AsyncSessionLocal() as session:
-                # Find due schedules
-                stmt = select(Schedule).where(
-                    Schedule.is_active == True,
-                    Schedule.next_run <= now
-                )
-                result = await session.execute(stmt)
-                schedules = result.scalars().all()
+            if last_reconcile is None or time.monotonic() - last_reconcile >= RECONCILE_INTERVAL:
+                await reconcile_schedules()
+                last_reconcile = time.monotonic()
+                asyncio.create_task(_prune_outbox_safely())
 
-                for sched in schedules:
-                    if sched.id in running_schedules:
-                        continue
-                    
-                    running_schedules.add(sched.id)
-                    # Use create_task to run non-blocking
-                    asyncio.create_task(execute_schedule_logic(bot, sched.id))
+            # Clear before reading the heap so a change made meanwhile still wakes us
+            schedule_timer.changed.clear()
 
-            await asyncio.sleep(10)
+            for sched_id in schedule_timer.pop_due(datetime.utcnow()):
+                if sched_id in running_schedules:
+                    continue
+
+                running_schedules.add(sched_id)
+                # Use create_task to run non-blocking
+                asyncio.create_task(execute_schedule_logic(bot, sched_id))
+
+            timeout = RECONCILE_INTERVAL - (time.monotonic() - last_reconcile)
+            deadline = schedule_timer.next_deadline()
+            if deadline:
+                timeout = min(timeout, (deadline - datetime.utcnow()).total_seconds())
+
+            try:
+                await asyncio.wait_for(schedule_timer.changed.wait(), timeout=max(0.0, timeout))
+            except asyncio.TimeoutError:
+                pass
 
         except Exception as e:
             logger.critical(f"Scheduler loop crash: {e}", exc_info=True)
-            await asyncio.sleep(10)
\ No newline at end of file
+            await asyncio.sleep(10)
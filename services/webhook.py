@@ -0,0 +1,70 @@
+# services/webhook.py
+"""
+Webhook ingestion: Telegram POSTs updates to the aiohttp app in main.py
+instead of the bot long-polling getUpdates.
+
+Each update is acknowledged as soon as it is parsed and handled in the
+background, so a slow handler never holds the HTTP response long enough for
+Telegram to redeliver (and the update to be processed twice). How many
+updates run at once is decided in one place only: ConcurrencyLimitMiddleware
+(middlewares/concurrency.py) queues them by priority and sheds under overload.
+"""
+import asyncio
+import logging
+
+from aiogram import Bot, Dispatcher
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler
+from aiohttp import web
+
+logger = logging.getLogger(__name__)
+
+# ==============================================================================
+# CONFIGURATION
+# ==============================================================================
+WEBHOOK_MAX_CONNECTIONS = 40   # Parallel connections Telegram may open (its default)
+WEBHOOK_DRAIN_TIMEOUT = 25     # Seconds to finish in-flight updates on shutdown (Heroku allows 30)
+
+
+class WebhookRequestHandler(SimpleRequestHandler):
+    def __init__(self, dispatcher: Dispatcher, bot: Bot, secret_token: str):
+        super().__init__(dispatcher, bot, handle_in_background=True, secret_token=secret_token)
+        # 503 until startup is done and again while shutting down; Telegram retries later
+        self.accepting = False
+        self.received = 0
+        self.refused = 0
+
+    async def _handle_request_background(self, bot: Bot, request: web.Request) -> web.Response:
+        if not self.accepting:
+            self.refused += 1
+            return web.Response(status=503)
+        update = await request.json(loads=bot.session.json_loads)
+        self.received += 1
+        task = asyncio.create_task(self._process(bot, update))
+        self._background_feed_update_tasks.add(task)
+        task.add_done_callback(self._background_feed_update_tasks.discard)
+        return web.json_response({}, dumps=bot.session.json_dumps)
+
+    async def _process(self, bot: Bot, update: dict):
+        try:
+            await self._background_feed_update(bot=bot, update=update)
+        except Exception as e:
+            # Already acknowledged, so there is nobody to report to but the log
+            logger.error(f"Update {update.get('update_id')} failed: {e}", exc_info=True)
+
+    def stats(self) -> dict:
+        return {
+            "received": self.received,
+            "refused": self.refused,
+            "in_flight": len(self._background_feed_update_tasks),
+        }
+
+    async def close(self) -> None:
+        """Stop accepting, let in-flight updates finish, then close the bot session."""
+        self.accepting = False
+        tasks = set(self._background_feed_update_tasks)
+        if tasks:
+            logger.info(f"Draining {len(tasks)} in-flight updates")
+            _, pending = await asyncio.wait(tasks, timeout=WEBHOOK_DRAIN_TIMEOUT)
+            if pending:
+                logger.warning(f"{len(pending)} updates still running after {WEBHOOK_DRAIN_TIMEOUT}s")
+        await super().close()
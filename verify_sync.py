@@ -47,7 +47,8 @@ except Exception as e:
 # Check handlers
 print("\n3. Checking handlers...")
 try:
-    from handlers.users import GENDERS, BATCHES
+    from handlers.users import GENDERS
+    from handlers.startup import BATCHES
     print(f"   [OK] GENDERS: {GENDERS}")
     print(f"   [OK] BATCHES: {BATCHES}")
 except Exception as e: